@@ -1,12 +1,24 @@
 # app.py
-from flask import Flask, render_template, request, redirect, url_for, flash, jsonify, session
+from flask import Flask, render_template, request, redirect, url_for, flash, jsonify, session, abort, Response, stream_with_context
 from flask_login import LoginManager, login_user, logout_user, login_required, current_user
+import click
+import csv
+import io
+import json
 import os
 from datetime import datetime
 
 from config import Config
-from models import db, Faculty, Division, Room, TimeSlot, Course
-from utils import TimetableScheduler
+from models import db, Faculty, Division, Room, TimeSlot, Course, ensure_indexes
+from utils import TimetableScheduler, ReferenceData
+from generator import TimetableGenerator
+from optimizer import SoftConstraints, TimetableOptimizer
+from importer import CourseImporter
+from exporter import iter_csv, iter_ics, term_start_date, timetable_document, timetable_rows, write_calendars
+from publisher import TimetablePublisher
+from events import TimetableEvents
+from storage import configure_sqlite
+import metrics
 
 # Initialize Flask app
 app = Flask(__name__)
@@ -17,6 +29,10 @@ os.makedirs('database', exist_ok=True)
 
 # Initialize database
 db.init_app(app)
+configure_sqlite(app)
+
+# Request, SQL, template and scheduler timings; first, so every hook is timed
+metrics.init_app(app)
 
 # Initialize login manager
 login_manager = LoginManager()
@@ -31,6 +47,7 @@ def load_user(user_id):
 @app.before_first_request
 def create_tables():
     db.create_all()
+    ensure_indexes(db.engine, app.logger)
     
     # Add some initial data if the database is empty
     if not TimeSlot.query.first():
@@ -122,6 +139,24 @@ def create_tables():
         # Commit changes
         db.session.commit()
 
+# Bring the in-memory indexes up to date with writes made by other workers
+@app.before_request
+def refresh_scheduler():
+    TimetableScheduler.refresh()
+    # Keep the change logs short; each process prunes at most hourly
+    TimetableScheduler.prune_changes(app.config['CHANGE_LOG_RETENTION_SECONDS'])
+
+# Keep the static student pages in STATIC_PUBLISH_DIR, if set, in step with
+# writes made by this request or seen by refresh_scheduler(). The pages are
+# written by a background thread, so requests never wait for them.
+publisher = TimetablePublisher()
+TimetableScheduler.add_change_listener(publisher.mark_changed)
+
+@app.after_request
+def publish_timetables(response):
+    publisher.wake(app)
+    return response
+
 # Routes
 @app.route('/')
 def index():
@@ -218,25 +253,28 @@ def add_schedule():
                 'original_time_slot_id': time_slot_id  # Add the original time slot ID
             }
             
-            # Get available time slots for this faculty and room
-            available_slots = TimetableScheduler.get_available_slots(current_user.id, room_id)
+            # Rank free rooms and time slots where this faculty and division are free
+            placements = TimetableScheduler.suggest_placements(
+                current_user.id, division_id, room_id, time_slot_id,
+                limit=app.config['PLACEMENT_SUGGESTIONS']
+            )
             
-            # If no available slots, let the faculty know
-            if not available_slots:
-                flash("No available time slots for this room. Please try a different room.", "danger")
+            # If nothing fits, let the faculty know
+            if not placements:
+                flash("No suitable room is free at any time slot. Please try a different room.", "danger")
                 return redirect(url_for('add_schedule'))
             
             # Return the resolve conflict template with all necessary data
             return render_template(
                 'resolve_conflict.html', 
-                available_slots=available_slots,
+                placements=placements,
                 conflict_details=conflict_details,
                 course_name=course_name,
                 division_id=division_id,
                 room_id=room_id,
-                room=Room.query.get(room_id),
-                division=Division.query.get(division_id),
-                requested_slot=TimeSlot.query.get(time_slot_id)
+                room=ReferenceData.room(room_id),
+                division=ReferenceData.division(division_id),
+                requested_slot=ReferenceData.time_slot(time_slot_id)
             )
     
     # Get all divisions, rooms, and time slots for the form
@@ -286,23 +324,26 @@ def resolve_conflict():
             session.pop('pending_course')
         return redirect(url_for('faculty_dashboard'))
     else:
-        # If there's still a conflict, show available slots again
-        available_slots = TimetableScheduler.get_available_slots(current_user.id, room_id)
+        # If there's still a conflict, show the alternatives again
+        placements = TimetableScheduler.suggest_placements(
+            current_user.id, division_id, room_id, time_slot_id,
+            limit=app.config['PLACEMENT_SUGGESTIONS']
+        )
         
-        if not available_slots:
-            flash("No available time slots for this room. Please try a different room.", "danger")
+        if not placements:
+            flash("No suitable room is free at any time slot. Please try a different room.", "danger")
             return redirect(url_for('add_schedule'))
         
         return render_template(
             'resolve_conflict.html', 
-            available_slots=available_slots,
+            placements=placements,
             conflict_details=conflict_details,
             course_name=course_name,
             division_id=division_id,
             room_id=room_id,
-            room=Room.query.get(room_id),
-            division=Division.query.get(division_id),
-            requested_slot=TimeSlot.query.get(time_slot_id)
+            room=ReferenceData.room(room_id),
+            division=ReferenceData.division(division_id),
+            requested_slot=ReferenceData.time_slot(time_slot_id)
         )
 
 @app.route('/faculty/edit_schedule/<int:course_id>', methods=['GET', 'POST'])
@@ -321,13 +362,17 @@ def edit_schedule(course_id):
         room_id = request.form.get('room_id')
         time_slot_id = request.form.get('time_slot_id')
         
-        # Check if the new room/time is different from the current one
-        is_changing_slot = (course.room_id != int(room_id) or course.time_slot_id != int(time_slot_id))
+        # Check if the new room/time/division is different from the current one
+        is_changing_slot = (course.room_id != int(room_id) or
+                            course.time_slot_id != int(time_slot_id) or
+                            course.division_id != int(division_id))
         
-        # Only need to check availability if changing the time or room
+        # Only need to check availability if changing the time, room or division
         is_available = True
         if is_changing_slot:
-            is_available = TimetableScheduler.check_availability(current_user.id, room_id, time_slot_id)
+            is_available = TimetableScheduler.check_availability(
+                current_user.id, room_id, time_slot_id, division_id, course_id
+            )
         
         if is_available or not is_changing_slot:
             # Update the course
@@ -335,45 +380,52 @@ def edit_schedule(course_id):
             course.division_id = division_id
             course.room_id = room_id
             course.time_slot_id = time_slot_id
-            db.session.commit()
-            
-            # Update data structures
-            TimetableScheduler._initialize_data_structures()
             
-            flash('Course updated successfully.', 'success')
-            return redirect(url_for('faculty_dashboard'))
-        else:
-            # Store the course information for the resolve conflict page
-            session['pending_edit'] = {
-                'course_id': course_id,
-                'name': course_name,
-                'division_id': division_id,
-                'room_id': room_id,
-            }
-            
-            # Get conflict details
-            conflict_details = TimetableScheduler.get_conflict_details(current_user.id, room_id, time_slot_id)
-            
-            # Get available time slots for this faculty and room
-            available_slots = TimetableScheduler.get_available_slots(current_user.id, room_id)
-            
-            # If no available slots, let the faculty know
-            if not available_slots:
-                flash("No available time slots for this room. Please try a different room.", "danger")
-                return redirect(url_for('edit_schedule', course_id=course_id))
-            
-            return render_template(
-                'resolve_edit_conflict.html', 
-                available_slots=available_slots,
-                conflict_details=conflict_details,
-                course=course,
-                course_name=course_name,
-                division_id=division_id,
-                room_id=room_id,
-                room=Room.query.get(room_id),
-                division=Division.query.get(division_id),
-                requested_slot=TimeSlot.query.get(time_slot_id)
-            )
+            # The database constraints reject the update if another request
+            # took the slot since the check
+            if TimetableScheduler.commit_booking():
+                # Update data structures
+                TimetableScheduler.reindex_course(course)
+                
+                flash('Course updated successfully.', 'success')
+                return redirect(url_for('faculty_dashboard'))
+        
+        # Store the course information for the resolve conflict page
+        session['pending_edit'] = {
+            'course_id': course_id,
+            'name': course_name,
+            'division_id': division_id,
+            'room_id': room_id,
+        }
+        
+        # Get conflict details
+        conflict_details = TimetableScheduler.get_conflict_details(
+            current_user.id, room_id, time_slot_id, division_id, course_id
+        )
+        
+        # Rank free rooms and time slots where this faculty and division are free
+        placements = TimetableScheduler.suggest_placements(
+            current_user.id, division_id, room_id, time_slot_id, course_id,
+            limit=app.config['PLACEMENT_SUGGESTIONS']
+        )
+        
+        # If nothing fits, let the faculty know
+        if not placements:
+            flash("No suitable room is free at any time slot. Please try a different room.", "danger")
+            return redirect(url_for('edit_schedule', course_id=course_id))
+        
+        return render_template(
+            'resolve_edit_conflict.html', 
+            placements=placements,
+            conflict_details=conflict_details,
+            course=course,
+            course_name=course_name,
+            division_id=division_id,
+            room_id=room_id,
+            room=ReferenceData.room(room_id),
+            division=ReferenceData.division(division_id),
+            requested_slot=ReferenceData.time_slot(time_slot_id)
+        )
     
     # Get all divisions, rooms, and time slots for the form
     divisions = Division.query.all()
@@ -400,7 +452,9 @@ def resolve_edit_conflict():
         return redirect(url_for('faculty_dashboard'))
     
     # Check availability with the new time slot
-    is_available = TimetableScheduler.check_availability(current_user.id, room_id, time_slot_id)
+    is_available = TimetableScheduler.check_availability(
+        current_user.id, room_id, time_slot_id, division_id, course.id
+    )
     
     if is_available:
         # Update the course
@@ -408,13 +462,17 @@ def resolve_edit_conflict():
         course.division_id = division_id
         course.room_id = room_id
         course.time_slot_id = time_slot_id
-        db.session.commit()
         
-        # Update data structures
-        TimetableScheduler._initialize_data_structures()
-        
-        flash('Course updated successfully.', 'success')
-    else:
+        # The database constraints reject the update if another request
+        # took the slot since the check
+        is_available = TimetableScheduler.commit_booking()
+        if is_available:
+            # Update data structures
+            TimetableScheduler.reindex_course(course)
+            
+            flash('Course updated successfully.', 'success')
+    
+    if not is_available:
         flash('The selected time slot is also not available. Please try again.', 'danger')
     
     # Clear the session data
@@ -437,11 +495,29 @@ def delete_schedule(course_id):
     db.session.commit()
     
     # Update data structures
-    TimetableScheduler._initialize_data_structures()
+    TimetableScheduler.unindex_course(course_id)
     
     flash('Course deleted successfully.', 'success')
     return redirect(url_for('faculty_dashboard'))
 
+@app.route('/faculty/import_courses', methods=['POST'])
+@login_required
+def import_courses():
+    upload = request.files.get('file')
+    if not upload:
+        return jsonify({'error': 'No file uploaded.'}), 400
+    
+    fmt = request.form.get('format') or CourseImporter.format_for(upload.filename or '')
+    if fmt not in CourseImporter.FORMATS:
+        return jsonify({'error': f'Unsupported format: {fmt}'}), 400
+    
+    # Decode the upload as it is read so large files are never held in memory
+    stream = io.TextIOWrapper(upload.stream, encoding='utf-8-sig', newline='')
+    # Faculty may only book their own courses; unrestricted imports are left to the CLI
+    importer = CourseImporter(faculty_id=current_user.id)
+    report = importer.import_stream(stream, fmt, dry_run=request.form.get('dry_run') == '1')
+    return jsonify(report.to_dict())
+
 @app.route('/student/timetable/<int:division_id>')
 def student_timetable(division_id):
     division = Division.query.get_or_404(division_id)
@@ -450,6 +526,193 @@ def student_timetable(division_id):
     
     return render_template('student_dashboard.html', timetable=timetable, division=division, divisions=divisions)
 
+@app.route('/export/timetable.csv')
+def export_timetable_csv():
+    # Stream straight from the database cursor so memory stays flat
+    return Response(
+        stream_with_context(iter_csv(timetable_rows())),
+        mimetype='text/csv',
+        headers={'Content-Disposition': 'attachment; filename=timetable.csv'}
+    )
+
+@app.route('/export/<kind>/<int:entity_id>.ics')
+def export_calendar(kind, entity_id):
+    if kind == 'faculty':
+        entity = Faculty.query.get_or_404(entity_id)
+        rows = timetable_rows(faculty_id=entity_id)
+    elif kind == 'division':
+        entity = Division.query.get_or_404(entity_id)
+        rows = timetable_rows(division_id=entity_id)
+    else:
+        abort(404)
+    
+    try:
+        term_start = term_start_date(request.args.get('start'))
+        weeks = request.args.get('weeks')
+        if weeks is not None:
+            weeks = int(weeks)
+            if weeks < 1:
+                raise ValueError(weeks)
+    except ValueError:
+        abort(400)
+    
+    return Response(
+        stream_with_context(iter_ics(rows, entity.name, term_start, weeks, app.config['TIMEZONE'])),
+        mimetype='text/calendar',
+        headers={'Content-Disposition': f'attachment; filename={kind}-{entity_id}.ics'}
+    )
+
+# JSON API
+TIMETABLE_KINDS = {
+    'faculty': ReferenceData.faculty,
+    'division': ReferenceData.division,
+    'room': ReferenceData.room,
+}
+
+@app.route('/api/timetable/<kind>/<int:entity_id>')
+def api_timetable(kind, entity_id):
+    lookup = TIMETABLE_KINDS.get(kind)
+    entity = lookup(entity_id) if lookup else None
+    if entity is None:
+        abort(404)
+    
+    # The tag comes from the in-memory indexes, so a client that already
+    # has this version gets a 304 without the matrix being built
+    etag = TimetableScheduler.get_timetable_etag(kind, entity_id)
+    if request.if_none_match.contains_weak(etag):
+        response = Response(status=304)
+    else:
+        timetable = getattr(TimetableScheduler, f'get_timetable_for_{kind}')(entity_id)
+        response = jsonify(timetable_document(kind, entity_id, entity.name, timetable))
+    
+    response.set_etag(etag)
+    # Clients may keep the response but must revalidate it before reuse
+    response.headers['Cache-Control'] = 'no-cache'
+    return response
+
+# Live timetable changes, fanned out in-process to server-sent event streams
+timetable_events = TimetableEvents(app.config['EVENT_STREAM_MAX_CLIENTS'],
+                                   app.config['EVENT_STREAM_POLL_SECONDS'])
+TimetableScheduler.add_change_listener(timetable_events.notify)
+
+@app.route('/api/timetable/<kind>/<int:entity_id>/events')
+def api_timetable_events(kind, entity_id):
+    lookup = TIMETABLE_KINDS.get(kind)
+    entity = lookup(entity_id) if lookup else None
+    if entity is None:
+        abort(404)
+    
+    subscription = timetable_events.subscribe(kind, entity_id)
+    if subscription is None:
+        # Pages still work without the stream; they just stop updating live
+        response = Response('Too many event streams', status=503)
+        response.headers['Retry-After'] = str(max(1, int(timetable_events.poll_interval)))
+        return response
+    
+    stream = timetable_events.stream(subscription, kind, entity_id, entity.name,
+                                     request.headers.get('Last-Event-ID'))
+    response = Response(stream_with_context(stream), mimetype='text/event-stream')
+    response.headers['Cache-Control'] = 'no-cache'
+    # Stop proxies such as nginx from buffering the stream
+    response.headers['X-Accel-Buffering'] = 'no'
+    return response
+
+# Prometheus metrics for this worker process
+@app.route('/metrics')
+def metrics_endpoint():
+    return Response(metrics.render(), content_type=metrics.CONTENT_TYPE)
+
+# CLI commands
+@app.cli.command('generate-timetable')
+@click.argument('demands_file', type=click.File('r'))
+@click.option('--dry-run', is_flag=True, help='Report placements without saving them.')
+def generate_timetable(demands_file, dry_run):
+    """Place the course demands in DEMANDS_FILE (a JSON list) automatically."""
+    generator = TimetableGenerator(json.load(demands_file))
+    result = generator.generate()
+    
+    for item in result.unplaced:
+        click.echo(f"Unplaced: {item['demand'].name} session {item['session']} - {item['reason']}")
+    
+    if dry_run:
+        click.echo(f"{len(result.placements)} sessions placed (dry run, nothing saved).")
+    else:
+        count = TimetableGenerator.commit(result)
+        click.echo(f"{count} sessions placed and saved.")
+
+@app.cli.command('optimize-timetable')
+@click.option('--time-budget', default=10.0, show_default=True, type=click.FloatRange(min=0, min_open=True),
+              help='Seconds per restart.')
+@click.option('--restarts', default=4, show_default=True, type=click.IntRange(min=1), help='Independent restarts.')
+@click.option('--workers', default=1, show_default=True, help='Processes to run restarts on.')
+@click.option('--seed', default=0, show_default=True, help='Base random seed.')
+@click.option('--max-iterations', type=int, help='Iteration cap per restart, for reproducible runs.')
+@click.option('--late-after', default='14:00', show_default=True, help='Classes from this time count as late.')
+@click.option('--dry-run', is_flag=True, help='Report the improvement without saving it.')
+def optimize_timetable(time_budget, restarts, workers, seed, max_iterations, late_after, dry_run):
+    """Improve the saved timetable against the soft constraints."""
+    optimizer = TimetableOptimizer(SoftConstraints(late_after=late_after))
+    result = optimizer.optimize(time_budget, restarts, workers, seed, max_iterations)
+    
+    click.echo(f"Cost {result.initial_cost:g} -> {result.cost:g} "
+               f"({result.changes} courses moved, seed {result.seed}).")
+    if not dry_run:
+        TimetableOptimizer.commit(result)
+
+@app.cli.command('import-courses')
+@click.argument('courses_file', type=click.Path(exists=True, dir_okay=False))
+@click.option('--format', 'fmt', type=click.Choice(CourseImporter.FORMATS),
+              help='File format; guessed from the extension by default.')
+@click.option('--report', 'report_file', type=click.File('w'), help='Write rejected rows to this CSV file.')
+@click.option('--dry-run', is_flag=True, help='Validate the file without saving anything.')
+def import_courses_command(courses_file, fmt, report_file, dry_run):
+    """Bulk import courses from a CSV or JSON Lines file."""
+    fmt = fmt or CourseImporter.format_for(courses_file)
+    with open(courses_file, encoding='utf-8-sig', newline='') as stream:
+        report = CourseImporter().import_stream(stream, fmt, dry_run)
+    
+    if report_file:
+        writer = csv.writer(report_file)
+        writer.writerow(['line', 'reason', 'row'])
+        for item in report.rejected:
+            writer.writerow([item['line'], item['reason'], json.dumps(item['row'])])
+    else:
+        for item in report.rejected:
+            click.echo(f"Line {item['line']}: {item['reason']}")
+    
+    click.echo(f"{report.accepted} courses {'valid' if dry_run else 'imported'}, "
+               f"{len(report.rejected)} rejected.")
+
+@app.cli.command('export-timetable')
+@click.argument('output', type=click.Path())
+@click.option('--format', 'fmt', type=click.Choice(['csv', 'ics']), default='csv', show_default=True,
+              help='csv writes one file; ics writes one calendar per entity into OUTPUT.')
+@click.option('--by', 'kind', type=click.Choice(['faculty', 'division']), default='division',
+              show_default=True, help='Entity to write calendars for.')
+@click.option('--start', help='Term start date (YYYY-MM-DD) for calendars.')
+@click.option('--weeks', type=click.IntRange(min=1), help='Number of weekly occurrences in calendars.')
+def export_timetable(output, fmt, kind, start, weeks):
+    """Export the whole schedule as CSV or per-entity iCalendar files."""
+    if fmt == 'csv':
+        with open(output, 'w', encoding='utf-8', newline='') as handle:
+            for chunk in iter_csv(timetable_rows()):
+                handle.write(chunk)
+        click.echo(f"Timetable written to {output}.")
+    else:
+        count = write_calendars(output, kind, term_start_date(start), weeks, app.config['TIMEZONE'])
+        click.echo(f"{count} calendars written to {output}.")
+
+@app.cli.command('publish-timetables')
+@click.argument('directory', type=click.Path(file_okay=False), required=False)
+@click.option('--force', is_flag=True, help='Rewrite every page, even if unchanged.')
+def publish_timetables_command(directory, force):
+    """Write static student timetables to DIRECTORY (default: STATIC_PUBLISH_DIR)."""
+    directory = directory or app.config.get('STATIC_PUBLISH_DIR')
+    if not directory:
+        raise click.UsageError('Give a DIRECTORY or set STATIC_PUBLISH_DIR.')
+    written = TimetablePublisher(directory).publish(force=force)
+    click.echo(f"{len(written)} division timetables written to {directory}.")
+
 # Run the application
 if __name__ == '__main__':
     app.run(debug=True)
\ No newline at end of file
@@ -0,0 +1,97 @@
+# benchmarks/conflict_graph.py
+"""
+Benchmark ConflictGraph.build_from_courses against the original pairwise build.
+
+Run from the project root:
+
+    python -m benchmarks.conflict_graph
+    python -m benchmarks.conflict_graph --sizes 10000 50000 --pairwise-limit 10000
+
+The pairwise build compares every pair of courses, so above --pairwise-limit its
+time is projected from the largest measured size (n^2 scaling) instead of run.
+"""
+import argparse
+import random
+import time
+from collections import defaultdict
+
+from utils import ConflictGraph, ScheduledCourse
+
+def generate_courses(count, time_slots=25, seed=42):
+    """Generate synthetic courses with a realistic resource-to-course ratio."""
+    rng = random.Random(seed)
+    faculty_count = max(1, count // 8)
+    room_count = max(1, count // 20)
+    division_count = max(1, count // 25)
+    
+    return [
+        ScheduledCourse(
+            course_id,
+            f'Course {course_id}',
+            rng.randint(1, faculty_count),
+            rng.randint(1, division_count),
+            rng.randint(1, room_count),
+            rng.randint(1, time_slots)
+        )
+        for course_id in range(1, count + 1)
+    ]
+
+def pairwise_build(courses):
+    """The original O(n^2) build with list-backed adjacency, kept for comparison."""
+    graph = defaultdict(list)
+    for course in courses:
+        graph[course.id] = []
+    
+    for i, course1 in enumerate(courses):
+        for j in range(i + 1, len(courses)):
+            course2 = courses[j]
+            if course1.time_slot_id == course2.time_slot_id:
+                if (course1.faculty_id == course2.faculty_id or
+                    course1.room_id == course2.room_id or
+                    course1.division_id == course2.division_id):
+                    if course2.id not in graph[course1.id]:
+                        graph[course1.id].append(course2.id)
+                    if course1.id not in graph[course2.id]:
+                        graph[course2.id].append(course1.id)
+    return graph
+
+def time_call(func, *args):
+    """Return the wall-clock seconds taken by a single call."""
+    start = time.perf_counter()
+    func(*args)
+    return time.perf_counter() - start
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--sizes', type=int, nargs='+', default=[1000, 10000, 50000])
+    parser.add_argument('--pairwise-limit', type=int, default=10000,
+                        help='largest size to run the pairwise build on')
+    args = parser.parse_args()
+    
+    print(f"{'courses':>8} {'edges':>9} {'bucketed (s)':>13} {'pairwise (s)':>14} {'speedup':>9}")
+    measured = None
+    for size in sorted(args.sizes):
+        courses = generate_courses(size)
+        graph = ConflictGraph()
+        bucketed = time_call(graph.build_from_courses, courses)
+        edges = sum(len(neighbors) for neighbors in graph.graph.values()) // 2
+        
+        if size <= args.pairwise_limit:
+            pairwise = time_call(pairwise_build, courses)
+            measured = (size, pairwise)
+            label = f'{pairwise:14.3f}'
+        elif measured:
+            pairwise = measured[1] * (size / measured[0]) ** 2
+            label = f'{pairwise:13.1f}*'
+        else:
+            pairwise = None
+            label = f"{'-':>14}"
+        
+        speedup = f'{pairwise / bucketed:8.0f}x' if pairwise else f"{'-':>9}"
+        print(f'{size:>8} {edges:>9} {bucketed:>13.3f} {label} {speedup}')
+    
+    if measured and max(args.sizes) > args.pairwise_limit:
+        print('* projected from the largest measured pairwise run')
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,145 @@
+# benchmarks/institution.py
+"""
+Fill the database schema with a synthetic institution.
+
+Run from the project root to write a database file to explore by hand:
+    
+    python -m benchmarks.institution synthetic.db --scale medium
+    python -m benchmarks.institution synthetic.db --faculty 300 --divisions 100 --courses 4000
+
+Courses are placed without clashes, as the unique indexes on Course require,
+so conflict density comes from load: the share of each division's, faculty
+member's and room's time slots that are taken. At the preset scales two
+thirds to four fifths of every division's week is booked, as in a real
+term, so conflict checks and free-slot searches hit busy resources often.
+"""
+import argparse
+import os
+import random
+from datetime import time as clock
+
+from flask import Flask
+
+from models import db, Course, Division, Faculty, Room, TimeSlot
+
+DAYS = ['Monday', 'Tuesday', 'Wednesday', 'Thursday', 'Friday']
+
+# Preset institution sizes; courses are attempted, a few may not fit
+SCALES = {
+    'small': dict(faculty=20, divisions=8, rooms=12, slots_per_day=8, courses=200),
+    'medium': dict(faculty=150, divisions=60, rooms=80, slots_per_day=10, courses=2000),
+    'large': dict(faculty=1200, divisions=500, rooms=600, slots_per_day=10, courses=20000),
+}
+
+# Password of every synthetic faculty member, for logging in through the routes
+PASSWORD = 'benchmark'
+
+def populate(faculty, divisions, rooms, slots_per_day, courses, lab_share=0.2, seed=42):
+    """
+    Create the schema and insert a clash-free synthetic institution.
+    
+    Args:
+        faculty: Number of faculty members (usernames f1, f2, ...)
+        divisions: Number of student divisions
+        rooms: Number of rooms, lab_share of them labs
+        slots_per_day: Hourly time slots per weekday, from 08:00
+        courses: Number of courses to place
+        lab_share: Fraction of rooms that are labs
+        seed: Random seed, so runs are repeatable
+    
+    Returns:
+        dict: Counts of what was inserted, and the division load
+    """
+    rng = random.Random(seed)
+    db.create_all()
+    
+    db.session.add_all([
+        TimeSlot(day=day, start_time=clock(8 + hour), end_time=clock(9 + hour))
+        for day in DAYS for hour in range(slots_per_day)
+    ])
+    db.session.bulk_insert_mappings(Division, [
+        {'name': f'Division {i}'} for i in range(1, divisions + 1)
+    ])
+    db.session.bulk_insert_mappings(Room, [
+        {'name': f'Room {i}', 'capacity': rng.choice([30, 40, 60, 90]),
+         'is_lab': rng.random() < lab_share}
+        for i in range(1, rooms + 1)
+    ])
+    # Hashing is slow by design, so every member shares one hash
+    template = Faculty(username='', email='', name='')
+    template.set_password(PASSWORD)
+    db.session.bulk_insert_mappings(Faculty, [
+        {'username': f'f{i}', 'email': f'f{i}@example.com', 'name': f'Faculty {i}',
+         'department': f'Department {i % 10}', 'password_hash': template.password_hash}
+        for i in range(1, faculty + 1)
+    ])
+    db.session.flush()
+    
+    slot_count = len(DAYS) * slots_per_day
+    taken = set()  # (resource kind, resource ID, slot ID)
+    rows = []
+    for index in range(courses):
+        division_id = index % divisions + 1
+        free_slots = [slot for slot in range(1, slot_count + 1)
+                      if ('division', division_id, slot) not in taken]
+        rng.shuffle(free_slots)
+        
+        # Try a few slots and people per course, as a registrar would
+        for time_slot_id in free_slots[:8]:
+            faculty_id = next((candidate for candidate in rng.sample(range(1, faculty + 1), min(faculty, 8))
+                               if ('faculty', candidate, time_slot_id) not in taken), None)
+            room_id = next((candidate for candidate in rng.sample(range(1, rooms + 1), min(rooms, 8))
+                            if ('room', candidate, time_slot_id) not in taken), None)
+            if faculty_id is None or room_id is None:
+                continue
+            
+            taken.update({('division', division_id, time_slot_id),
+                          ('faculty', faculty_id, time_slot_id),
+                          ('room', room_id, time_slot_id)})
+            rows.append({'name': f'Course {index + 1}', 'faculty_id': faculty_id,
+                         'division_id': division_id, 'room_id': room_id,
+                         'time_slot_id': time_slot_id})
+            break
+    
+    db.session.bulk_insert_mappings(Course, rows)
+    db.session.commit()
+    return {
+        'faculty': faculty,
+        'divisions': divisions,
+        'rooms': rooms,
+        'time_slots': slot_count,
+        'courses': len(rows),
+        'division_load': round(len(rows) / (divisions * slot_count), 3),
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('database', help='SQLite file to create')
+    parser.add_argument('--scale', choices=SCALES, default='small')
+    for name in ('faculty', 'divisions', 'rooms', 'slots-per-day', 'courses'):
+        parser.add_argument(f'--{name}', type=int, help='overrides the scale preset')
+    parser.add_argument('--lab-share', type=float, default=0.2)
+    parser.add_argument('--seed', type=int, default=42)
+    args = parser.parse_args()
+    
+    spec = dict(SCALES[args.scale])
+    for name in spec:
+        if getattr(args, name) is not None:
+            spec[name] = getattr(args, name)
+    
+    if os.path.exists(args.database):
+        parser.error(f'{args.database} already exists')
+    
+    app = Flask(__name__)
+    # Flask-SQLAlchemy resolves relative SQLite paths against the app root
+    app.config['SQLALCHEMY_DATABASE_URI'] = 'sqlite:///' + os.path.abspath(args.database)
+    app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
+    db.init_app(app)
+    with app.app_context():
+        summary = populate(lab_share=args.lab_share, seed=args.seed, **spec)
+    
+    print(', '.join(f'{key} {value}' for key, value in summary.items()))
+    print(f"Log in as f1 .. f{spec['faculty']} with password '{PASSWORD}'.")
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,86 @@
+# benchmarks/query_count.py
+"""
+Check that building a timetable issues a constant number of SQL statements.
+
+Run from the project root:
+    
+    python -m benchmarks.query_count
+
+Seeds an in-memory database with growing numbers of courses for one faculty
+and division, counts the statements issued by get_timetable_for_faculty and
+get_timetable_for_division, and exits non-zero if the count grows with the
+number of courses (an N+1 lazy-load regression).
+"""
+import sys
+from datetime import time
+
+from flask import Flask
+from sqlalchemy import event
+
+from models import db, Course, Faculty, Division, Room, TimeSlot
+from utils import TimetableScheduler
+
+def create_app():
+    app = Flask(__name__)
+    app.config['SQLALCHEMY_DATABASE_URI'] = 'sqlite://'
+    app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
+    db.init_app(app)
+    return app
+
+def seed(course_count):
+    """Recreate the schema with one faculty and division holding course_count courses."""
+    db.drop_all()
+    db.create_all()
+    days = ['Monday', 'Tuesday', 'Wednesday', 'Thursday', 'Friday']
+    slots = [
+        TimeSlot(day=day, start_time=time(hour), end_time=time(hour + 1))
+        for day in days for hour in range(8, 18)
+    ]
+    faculty = Faculty(username='bench', email='bench@example.com', name='Bench')
+    division = Division(name='Bench Division')
+    rooms = [Room(name=f'Room {i}') for i in range(course_count)]
+    db.session.add_all(slots + rooms + [faculty, division])
+    db.session.flush()
+    db.session.add_all([
+        Course(name=f'Course {i}', faculty_id=faculty.id, division_id=division.id,
+               room_id=rooms[i].id, time_slot_id=slots[i].id)
+        for i in range(course_count)
+    ])
+    db.session.commit()
+    return faculty.id, division.id
+
+def count_statements(func, *args):
+    """Return how many SQL statements a call issues."""
+    statements = []
+    listener = lambda *event_args: statements.append(event_args[2])
+    event.listen(db.engine, 'before_cursor_execute', listener)
+    try:
+        func(*args)
+    finally:
+        event.remove(db.engine, 'before_cursor_execute', listener)
+    return len(statements)
+
+def main():
+    app = create_app()
+    counts = {}
+    with app.app_context():
+        for course_count in (1, 10, 50):
+            faculty_id, division_id = seed(course_count)
+            db.session.expunge_all()
+            # Start cold so nothing is served from the caches
+            TimetableScheduler.resync()
+            counts[course_count] = (
+                count_statements(TimetableScheduler.get_timetable_for_faculty, faculty_id),
+                count_statements(TimetableScheduler.get_timetable_for_division, division_id)
+            )
+            print(f'{course_count:>4} courses: faculty {counts[course_count][0]} queries, '
+                  f'division {counts[course_count][1]} queries')
+    
+    if len(set(counts.values())) != 1:
+        print('FAIL: query count grows with the number of courses')
+        return 1
+    print('OK: query count is constant')
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,178 @@
+# benchmarks/read_latency.py
+"""
+Measure student dashboard read latency while bookings are being written.
+
+Run from the project root:
+    
+    python -m benchmarks.read_latency
+    python -m benchmarks.read_latency --courses 50000 --duration 10 --write-interval 0.001
+
+Each storage profile gets a fresh database file seeded with --courses
+courses. A separate writer process then books courses in one-row
+transactions, as the booking routes do, pausing --write-interval seconds
+between bookings, while this process repeatedly runs
+the query and matrix build behind the student dashboard for random
+divisions. The timetable cache is bypassed so every read hits the database.
+
+Profiles:
+    baseline    default rollback journal, no Course indexes, a new
+                connection per request
+    production  Config.SQLITE_PRAGMAS (WAL and friends), the Course indexes
+                and a connection pool
+"""
+import argparse
+import multiprocessing
+import os
+import random
+import sqlite3
+import statistics
+import tempfile
+import time
+from datetime import time as clock
+
+from flask import Flask
+from sqlalchemy import event
+
+from config import Config
+from models import db, Course, Division, Faculty, Room, TimeSlot
+from storage import apply_pragmas
+from utils import TimetableScheduler
+
+PROFILES = ('baseline', 'production')
+SLOTS_PER_DIVISION = 20
+
+def create_app(path, profile):
+    app = Flask(__name__)
+    app.config['SQLALCHEMY_DATABASE_URI'] = 'sqlite:///' + path
+    app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
+    if profile == 'production':
+        app.config['SQLALCHEMY_ENGINE_OPTIONS'] = Config.SQLALCHEMY_ENGINE_OPTIONS
+    db.init_app(app)
+    return app
+
+def seed(course_count, profile):
+    """Create the schema and insert course_count clash-free courses."""
+    db.create_all()
+    if profile == 'baseline':
+        for index in Course.__table__.indexes:
+            index.drop(db.engine)
+    
+    division_count = max(1, course_count // SLOTS_PER_DIVISION)
+    days = ['Monday', 'Tuesday', 'Wednesday', 'Thursday', 'Friday']
+    db.session.add_all([
+        TimeSlot(day=day, start_time=clock(hour), end_time=clock(hour + 1))
+        for day in days for hour in range(9, 9 + SLOTS_PER_DIVISION // len(days))
+    ])
+    db.session.bulk_insert_mappings(Division, [
+        {'name': f'Division {i}'} for i in range(division_count)
+    ])
+    # One room per division, so rooms never clash
+    db.session.bulk_insert_mappings(Room, [
+        {'name': f'Room {i}', 'capacity': 40} for i in range(division_count)
+    ])
+    db.session.bulk_insert_mappings(Faculty, [
+        {'username': f'f{i}', 'email': f'f{i}@example.com', 'name': f'Faculty {i}'}
+        for i in range(course_count // 4 + 1)
+    ])
+    db.session.bulk_insert_mappings(Course, [
+        {
+            'name': f'Course {i}',
+            # Four consecutive slots per faculty
+            'faculty_id': i // 4 + 1,
+            'division_id': i // SLOTS_PER_DIVISION + 1,
+            'room_id': i // SLOTS_PER_DIVISION + 1,
+            'time_slot_id': i % SLOTS_PER_DIVISION + 1
+        }
+        for i in range(division_count * SLOTS_PER_DIVISION)
+    ])
+    db.session.commit()
+    return division_count
+
+def write_bookings(path, pragmas, stop_at, interval, counter):
+    """Writer process: one INSERT per transaction until stop_at."""
+    connection = sqlite3.connect(path, timeout=5.0, isolation_level=None)
+    apply_pragmas(connection, pragmas)
+    # Resources outside the seeded ranges, so bookings never clash
+    resource_id = 10 ** 6
+    while time.time() < stop_at:
+        resource_id += 1
+        connection.execute('BEGIN IMMEDIATE')
+        cursor = connection.execute(
+            'INSERT INTO course (name, faculty_id, division_id, room_id, time_slot_id) '
+            'VALUES (?, ?, ?, ?, ?)',
+            ('Booking', resource_id, resource_id, resource_id, 1)
+        )
+        connection.execute('INSERT INTO course_change (course_id) VALUES (?)', (cursor.lastrowid,))
+        connection.execute('COMMIT')
+        counter.value += 1
+        time.sleep(interval)
+    connection.close()
+
+def percentile(samples, fraction):
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * fraction))]
+
+def run_profile(profile, course_count, duration, interval, seed_value):
+    """Seed a database, run the writer and sample reads for duration seconds."""
+    handle, path = tempfile.mkstemp(suffix='.db')
+    os.close(handle)
+    pragmas = Config.SQLITE_PRAGMAS if profile == 'production' else {}
+    
+    app = create_app(path, profile)
+    with app.app_context():
+        if pragmas:
+            event.listen(db.engine, 'connect',
+                         lambda connection, record: apply_pragmas(connection, pragmas))
+        division_count = seed(course_count, profile)
+        TimetableScheduler.invalidate_slot_grid()
+        TimetableScheduler.get_slot_grid()
+        db.session.remove()
+        
+        counter = multiprocessing.Value('i', 0)
+        stop_at = time.time() + duration
+        writer = multiprocessing.Process(
+            target=write_bookings, args=(path, pragmas, stop_at, interval, counter)
+        )
+        writer.start()
+        
+        rng = random.Random(seed_value)
+        samples = []
+        while time.time() < stop_at:
+            division_id = rng.randint(1, division_count)
+            start = time.perf_counter()
+            rows = TimetableScheduler.get_timetable_rows(division_id=division_id)
+            TimetableScheduler.build_timetable_matrix(rows)
+            samples.append(time.perf_counter() - start)
+            # Each dashboard request uses its own session
+            db.session.remove()
+        writer.join()
+        db.engine.dispose()
+    
+    for suffix in ('', '-wal', '-shm'):
+        if os.path.exists(path + suffix):
+            os.remove(path + suffix)
+    return samples, counter.value
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--courses', type=int, default=20000)
+    parser.add_argument('--duration', type=float, default=5.0, help='seconds per profile')
+    parser.add_argument('--profiles', nargs='+', choices=PROFILES, default=list(PROFILES))
+    parser.add_argument('--write-interval', type=float, default=0.005,
+                        help='seconds the writer pauses between bookings')
+    parser.add_argument('--seed', type=int, default=42)
+    args = parser.parse_args()
+    
+    print(f"{'profile':>10} {'reads':>7} {'writes':>7} {'p50 (ms)':>9} {'p95 (ms)':>9} "
+          f"{'p99 (ms)':>9} {'max (ms)':>9}")
+    for profile in args.profiles:
+        samples, writes = run_profile(profile, args.courses, args.duration,
+                                      args.write_interval, args.seed)
+        print(f'{profile:>10} {len(samples):>7} {writes:>7} '
+              f'{statistics.median(samples) * 1000:>9.2f} '
+              f'{percentile(samples, 0.95) * 1000:>9.2f} '
+              f'{percentile(samples, 0.99) * 1000:>9.2f} '
+              f'{max(samples) * 1000:>9.2f}')
+
+if __name__ == '__main__':
+    main()
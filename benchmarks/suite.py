@@ -0,0 +1,274 @@
+# benchmarks/suite.py
+"""
+Time the scheduler and the main routes on synthetic institutions.
+
+Run from the project root:
+    
+    python -m benchmarks.suite
+    python -m benchmarks.suite --scales small medium large --output results.json
+    python -m benchmarks.suite --compare results.json --fail-above 1.25
+
+Each scale gets a fresh database filled by benchmarks.institution. The
+scheduler is timed directly (conflict graph build, full index load,
+availability checks, free-slot searches, ranked placement suggestions,
+division timetables with a cold and a warm cache) and the routes through the Flask test client, logged in
+as a synthetic faculty member. Times are per call, in milliseconds.
+
+--output writes the results as JSON together with the commit and Python
+version. --compare prints the ratio of each median to the same benchmark
+in an earlier results file, and --fail-above exits non-zero if any ratio
+exceeds it, so a regression between commits can fail a build.
+"""
+import argparse
+import itertools
+import json
+import os
+import platform
+import random
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime
+
+from app import app
+from models import db
+from utils import ConflictGraph, ReferenceData, TimetableScheduler
+from benchmarks.institution import SCALES, PASSWORD, populate
+
+def measure(func, repeat, number=1):
+    """Return repeat samples of the mean seconds per call over number calls."""
+    samples = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        for _ in range(number):
+            func()
+        samples.append((time.perf_counter() - start) / number)
+    return samples
+
+def summarize(name, samples, **extra):
+    """Build a result record with per-call times in milliseconds."""
+    return dict(
+        benchmark=name,
+        unit='ms',
+        samples=len(samples),
+        min=round(min(samples) * 1000, 4),
+        median=round(statistics.median(samples) * 1000, 4),
+        mean=round(statistics.mean(samples) * 1000, 4),
+        max=round(max(samples) * 1000, 4),
+        **extra
+    )
+
+def clear_timetable_cache():
+    with TimetableScheduler._cache_lock:
+        TimetableScheduler._timetable_matrix.clear()
+
+def reset_scheduler():
+    """Drop every in-process cache left from the previous database."""
+    for name in ('faculty', 'room', 'division'):
+        ReferenceData.invalidate(name)
+    TimetableScheduler.invalidate_slot_grid()
+    TimetableScheduler.resync()
+
+def expect(response, *statuses):
+    """Fail loudly if a route did not do the work being timed."""
+    if response.status_code not in statuses:
+        raise RuntimeError(f'{response.request.path} returned {response.status_code}')
+    return response
+
+def bench_scheduler(summary, repeat, rng):
+    """Time the scheduler operations on the current database."""
+    results = []
+    snapshot = TimetableScheduler.get_snapshot()
+    courses = list(snapshot.conflict_graph.courses.values())
+    slot_ids = TimetableScheduler.get_slot_grid().slot_ids
+    faculty_ids = range(1, summary['faculty'] + 1)
+    room_ids = range(1, summary['rooms'] + 1)
+    division_ids = range(1, summary['divisions'] + 1)
+    
+    results.append(summarize('conflict_graph.build_from_courses', measure(
+        lambda: ConflictGraph().build_from_courses(courses), repeat
+    )))
+    results.append(summarize('scheduler.initialize_data_structures', measure(
+        TimetableScheduler._initialize_data_structures, repeat
+    )))
+    
+    probes = [(rng.choice(faculty_ids), rng.choice(room_ids), rng.choice(slot_ids),
+               rng.choice(division_ids)) for _ in range(1000)]
+    conflict_rate = sum(
+        not TimetableScheduler.check_availability(*probe) for probe in probes
+    ) / len(probes)
+    probe = itertools.cycle(probes).__next__
+    results.append(summarize('scheduler.check_availability', measure(
+        lambda: TimetableScheduler.check_availability(*probe()), repeat, number=len(probes)
+    ), conflict_rate=round(conflict_rate, 3)))
+    
+    searches = itertools.cycle([
+        (rng.choice(faculty_ids), rng.choice(room_ids), rng.choice(division_ids))
+        for _ in range(200)
+    ]).__next__
+    results.append(summarize('scheduler.get_available_slots', measure(
+        lambda: TimetableScheduler.get_available_slots(*searches()), repeat, number=200
+    )))
+    
+    placements = itertools.cycle([
+        (rng.choice(faculty_ids), rng.choice(division_ids), rng.choice(room_ids), rng.choice(slot_ids))
+        for _ in range(200)
+    ]).__next__
+    results.append(summarize('scheduler.suggest_placements', measure(
+        lambda: TimetableScheduler.suggest_placements(*placements()), repeat, number=200
+    )))
+    
+    sample = [rng.choice(division_ids) for _ in range(50)]
+    divisions = itertools.cycle(sample).__next__
+    def cold_timetable():
+        clear_timetable_cache()
+        TimetableScheduler.get_timetable_for_division(divisions())
+    results.append(summarize('scheduler.get_timetable_for_division.cold', measure(
+        cold_timetable, repeat, number=50
+    )))
+    for division_id in sample:
+        TimetableScheduler.get_timetable_for_division(division_id)
+    results.append(summarize('scheduler.get_timetable_for_division.warm', measure(
+        lambda: TimetableScheduler.get_timetable_for_division(divisions()), repeat, number=50
+    )))
+    return results
+
+def bench_routes(summary, repeat, rng, number=20):
+    """Time the main routes through the test client."""
+    results = []
+    client = app.test_client()
+    expect(client.post('/login', data={'username': 'f1', 'password': PASSWORD}), 302)
+    
+    snapshot = TimetableScheduler.get_snapshot()
+    division_ids = range(1, summary['divisions'] + 1)
+    divisions = itertools.cycle([rng.choice(division_ids) for _ in range(number)]).__next__
+    
+    # A booking that clashes with one of f1's courses, and a free place to book.
+    # The clash renders the alternatives, or redirects if there are none.
+    busy_slot = next(iter(snapshot.faculty_schedule.get(1, {})), None)
+    free = next(
+        (room_id, division_id, slot.id)
+        for room_id in range(1, summary['rooms'] + 1)
+        for division_id in division_ids
+        for slot in TimetableScheduler.get_free_slots(1, room_id, division_id)
+    )
+    etag = '"' + TimetableScheduler.get_timetable_etag('division', 1) + '"'
+    
+    def book_and_delete():
+        room_id, division_id, slot_id = free
+        expect(client.post('/faculty/add_schedule', data={
+            'course_name': 'Benchmark', 'division_id': division_id,
+            'room_id': room_id, 'time_slot_id': slot_id
+        }), 302)
+        course = TimetableScheduler.get_snapshot().faculty_schedule[1][slot_id]
+        expect(client.get(f'/faculty/delete_schedule/{course.id}'), 302)
+    
+    routes = [
+        ('route.index', lambda: expect(client.get('/'), 200)),
+        ('route.student_timetable',
+         lambda: expect(client.get(f'/student/timetable/{divisions()}'), 200)),
+        ('route.faculty_dashboard', lambda: expect(client.get('/faculty/dashboard'), 200)),
+        ('route.add_schedule.form', lambda: expect(client.get('/faculty/add_schedule'), 200)),
+        ('route.api_timetable',
+         lambda: expect(client.get(f'/api/timetable/division/{divisions()}'), 200)),
+        ('route.api_timetable.not_modified',
+         lambda: expect(client.get('/api/timetable/division/1',
+                                   headers={'If-None-Match': etag}), 304)),
+        ('route.add_and_delete_schedule', book_and_delete),
+    ]
+    if busy_slot is not None:
+        routes.append(('route.add_schedule.conflict', lambda: expect(client.post(
+            '/faculty/add_schedule', data={'course_name': 'Benchmark', 'division_id': 1,
+                                           'room_id': 1, 'time_slot_id': busy_slot}
+        ), 200, 302)))
+    
+    for name, func in routes:
+        results.append(summarize(name, measure(func, repeat, number=number)))
+    return results
+
+def run_scale(scale, repeat, seed):
+    """Build a database for one scale and run every benchmark on it."""
+    handle, path = tempfile.mkstemp(suffix='.db')
+    os.close(handle)
+    app.config['SQLALCHEMY_DATABASE_URI'] = 'sqlite:///' + path
+    try:
+        with app.app_context():
+            summary = populate(seed=seed, **SCALES[scale])
+            reset_scheduler()
+            db.session.remove()
+            rng = random.Random(seed)
+            results = bench_scheduler(summary, repeat, rng) + bench_routes(summary, repeat, rng)
+            db.session.remove()
+            db.engine.dispose()
+    finally:
+        for suffix in ('', '-wal', '-shm'):
+            if os.path.exists(path + suffix):
+                os.remove(path + suffix)
+    return summary, [dict(scale=scale, **result) for result in results]
+
+def git_commit():
+    try:
+        return subprocess.run(['git', 'rev-parse', 'HEAD'], capture_output=True,
+                              text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--scales', nargs='+', choices=SCALES, default=['small', 'medium'])
+    parser.add_argument('--repeat', type=int, default=5, help='samples per benchmark')
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--output', help='write the results to this JSON file')
+    parser.add_argument('--compare', help='earlier JSON results to compare medians with')
+    parser.add_argument('--fail-above', type=float,
+                        help='exit 1 if any median is this many times the earlier one')
+    args = parser.parse_args()
+    
+    app.config['TESTING'] = True
+    # Keep the page caches on, as in production, but publish nothing
+    app.config['STATIC_PUBLISH_DIR'] = None
+    
+    baseline = {}
+    if args.compare:
+        with open(args.compare, encoding='utf-8') as handle:
+            baseline = {(result['scale'], result['benchmark']): result
+                        for result in json.load(handle)['results']}
+    
+    report = {
+        'created': datetime.utcnow().isoformat(timespec='seconds') + 'Z',
+        'commit': git_commit(),
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'seed': args.seed,
+        'repeat': args.repeat,
+        'institutions': {},
+        'results': [],
+    }
+    
+    regressions = []
+    print(f"{'scale':<7} {'benchmark':<42} {'median (ms)':>12} {'min (ms)':>10} {'vs before':>10}")
+    for scale in args.scales:
+        summary, results = run_scale(scale, args.repeat, args.seed)
+        report['institutions'][scale] = summary
+        report['results'].extend(results)
+        for result in results:
+            before = baseline.get((scale, result['benchmark']))
+            ratio = result['median'] / before['median'] if before and before['median'] else None
+            if ratio is not None and args.fail_above and ratio > args.fail_above:
+                regressions.append((scale, result['benchmark'], ratio))
+            print(f"{scale:<7} {result['benchmark']:<42} {result['median']:>12.3f} "
+                  f"{result['min']:>10.3f} {f'{ratio:.2f}x' if ratio else '-':>10}")
+    
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as handle:
+            json.dump(report, handle, indent=2)
+        print(f'Results written to {args.output}')
+    
+    for scale, name, ratio in regressions:
+        print(f'REGRESSION: {scale} {name} is {ratio:.2f}x slower')
+    return 1 if regressions else 0
+
+if __name__ == '__main__':
+    sys.exit(main())
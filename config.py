@@ -1,7 +1,53 @@
 # config.py
+from sqlalchemy.pool import QueuePool
+
 class Config:
     """Configuration settings for the Timetable Scheduling System."""
     SECRET_KEY = 'your-secret-key-here'
     SQLALCHEMY_DATABASE_URI = 'sqlite:///database/timetable.db'
     SQLALCHEMY_TRACK_MODIFICATIONS = False
-    DEBUG = True
\ No newline at end of file
+    DEBUG = True
+    
+    # IANA time zone the time slots are in, used by the calendar exports
+    TIMEZONE = 'UTC'
+    
+    # Directory to keep pre-rendered student timetables in (see publisher.py),
+    # or None to serve them from the application only
+    STATIC_PUBLISH_DIR = None
+    
+    # Live timetable event streams (see events.py). Each open stream holds a
+    # server thread for as long as the client stays connected, so serve the
+    # application with an async worker (e.g. gunicorn -k gevent) when the
+    # streams are used; under sync or threaded workers keep the cap well
+    # below the worker's thread count. Past the cap a stream request gets a
+    # 503 with Retry-After. Idle streams check for other workers' writes
+    # every EVENT_STREAM_POLL_SECONDS.
+    EVENT_STREAM_MAX_CLIENTS = 100
+    EVENT_STREAM_POLL_SECONDS = 5
+    
+    # Alternative rooms and time slots offered when a booking conflicts
+    PLACEMENT_SUGGESTIONS = 10
+    
+    # Age after which course_change and reference_change rows are pruned. A
+    # worker idle for longer than this reloads its indexes in full.
+    CHANGE_LOG_RETENTION_SECONDS = 86400
+    
+    # Log requests slower than this many seconds with their SQL, template and
+    # scheduler breakdown (see metrics.py), or None to log none
+    SLOW_REQUEST_SECONDS = None
+    
+    # SQLite storage profile, applied to every new connection (see storage.py)
+    SQLITE_PRAGMAS = {
+        'journal_mode': 'WAL',     # Readers no longer wait for a writer
+        'synchronous': 'NORMAL',   # Safe with WAL; fsync at checkpoints only
+        'cache_size': -65536,      # 64 MiB page cache (negative values are KiB)
+        'mmap_size': 268435456,    # Read up to 256 MiB through memory-mapped I/O
+        'busy_timeout': 5000,      # Wait up to 5 s for a lock instead of failing
+    }
+    
+    # Keep connections, and with them the page cache, open between requests.
+    # The pool hands each connection to one thread at a time.
+    SQLALCHEMY_ENGINE_OPTIONS = {
+        'poolclass': QueuePool,
+        'connect_args': {'check_same_thread': False},
+    }
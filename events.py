@@ -0,0 +1,201 @@
+# events.py
+"""
+Server-sent event streams of timetable changes.
+
+Each client of /api/timetable/<kind>/<id>/events holds a Subscription. On a
+write, TimetableScheduler's change listener wakes the subscriptions of the
+changed timetables; it never queues event data. The streaming thread then
+compares the entity's cells in the current snapshot with the cells it last
+sent and emits one patch event with only the cells that differ. A client's
+buffer is therefore a single wake-up flag however many writes it falls
+behind, and a slow client only delays its own stream.
+
+Events:
+    reset    the whole timetable, as from /api/timetable/<kind>/<id>; sent on
+             connect unless Last-Event-ID is already current, and when the
+             time slots change
+    patch    {"changes": [{"day", "time", "course"}]}, course null when the
+             cell was emptied
+
+Every event's id is the timetable's ETag, so a reconnecting EventSource that
+missed nothing gets no reset.
+"""
+import json
+import threading
+from collections import defaultdict
+
+from exporter import timetable_document
+from models import db
+from utils import TimetableScheduler, ReferenceData
+
+# Days shown by the timetable matrices and pages
+DAYS = ('Monday', 'Tuesday', 'Wednesday', 'Thursday', 'Friday')
+
+# Names shown in each kind's cells, after the course ID and name
+CELL_FIELDS = {
+    'faculty': ('room', 'division'),
+    'division': ('room', 'faculty'),
+    'room': ('division', 'faculty'),
+}
+
+def timetable_cells(kind, entity_id, snapshot):
+    """
+    Get a timetable's occupied cells from a snapshot.
+    
+    Returns:
+        dict: (day, time key) -> cell, in the timetable matrix format
+    """
+    grid = TimetableScheduler.get_slot_grid()
+    schedule = getattr(snapshot, f'{kind}_schedule').get(int(entity_id), {})
+    
+    cells = {}
+    for time_slot_id, course in schedule.items():
+        position = grid.cells.get(time_slot_id)
+        if position is None or position[0] not in DAYS:
+            continue
+        cell = {'id': course.id, 'name': course.name}
+        for field in CELL_FIELDS[kind]:
+            record = getattr(ReferenceData, field)(getattr(course, f'{field}_id'))
+            cell[field] = record.name if record else None
+        cells[position] = cell
+    return cells
+
+def format_event(name, data, event_id=None):
+    """Format one server-sent event."""
+    lines = [f'id: {event_id}'] if event_id else []
+    lines.append(f'event: {name}')
+    lines.append(f'data: {json.dumps(data)}')
+    return '\n'.join(lines) + '\n\n'
+
+class Subscription:
+    """One client's interest in one timetable."""
+    def __init__(self, key):
+        self.key = key
+        self._changed = threading.Event()
+    
+    def wake(self):
+        self._changed.set()
+    
+    def wait(self, timeout):
+        """Wait for a change; returns True and clears the flag if one arrived."""
+        if self._changed.wait(timeout):
+            self._changed.clear()
+            return True
+        return False
+
+class TimetableEvents:
+    """
+    In-process fan-out of timetable changes to event stream clients.
+    
+    Register notify() with TimetableScheduler.add_change_listener(). Writes
+    made by other workers reach this process through TimetableScheduler.refresh(),
+    which streams call whenever they have been idle for poll_interval.
+    """
+    
+    def __init__(self, max_clients=100, poll_interval=5.0):
+        """
+        Args:
+            max_clients: Streams allowed at once; each holds a server thread
+            poll_interval: Seconds between refreshes and keep-alives when idle
+        """
+        self.max_clients = max_clients
+        self.poll_interval = poll_interval
+        self._lock = threading.Lock()
+        self._subscriptions = defaultdict(set)  # Timetable key -> Subscriptions
+        self._count = 0
+    
+    def notify(self, keys):
+        """Change listener: wake the streams of the changed timetables, or all for None."""
+        with self._lock:
+            if keys is None:
+                subscriptions = [s for group in self._subscriptions.values() for s in group]
+            else:
+                subscriptions = [s for key in keys for s in self._subscriptions.get(key, ())]
+        for subscription in subscriptions:
+            subscription.wake()
+    
+    def subscribe(self, kind, entity_id):
+        """Get a Subscription for a timetable, or None if max_clients are connected."""
+        with self._lock:
+            if self._count >= self.max_clients:
+                return None
+            subscription = Subscription(f'{kind}_{int(entity_id)}')
+            self._subscriptions[subscription.key].add(subscription)
+            self._count += 1
+            return subscription
+    
+    def unsubscribe(self, subscription):
+        with self._lock:
+            group = self._subscriptions.get(subscription.key)
+            if group and subscription in group:
+                group.discard(subscription)
+                self._count -= 1
+                if not group:
+                    del self._subscriptions[subscription.key]
+    
+    def stream(self, subscription, kind, entity_id, name, last_event_id=None):
+        """
+        Yield the event stream of one subscription until the client leaves.
+        
+        Must run inside the request context (stream_with_context), since
+        refreshing and reloading names use the database session. The session
+        is released after every step so an idle stream holds no transaction.
+        
+        Args:
+            subscription: From subscribe(); released when the stream ends
+            kind: 'faculty', 'division' or 'room'
+            entity_id: ID of the faculty, division or room
+            name: Display name of the entity, for reset events
+            last_event_id: The client's Last-Event-ID header, if any
+        """
+        try:
+            snapshot = TimetableScheduler.get_snapshot()
+            etag = TimetableScheduler.get_timetable_etag(kind, entity_id, snapshot)
+            layout = TimetableScheduler.get_slot_grid().digest
+            cells = timetable_cells(kind, entity_id, snapshot)
+            
+            event = f'retry: {int(self.poll_interval * 1000)}\n\n'
+            if last_event_id != etag:
+                event += self._reset(kind, entity_id, name, etag)
+            db.session.remove()
+            yield event
+            
+            while True:
+                if not subscription.wait(self.poll_interval):
+                    # Idle: pick up other workers' writes, which wake us through notify()
+                    TimetableScheduler.refresh()
+                    db.session.remove()
+                    if not subscription.wait(0):
+                        yield ': keep-alive\n\n'
+                        continue
+                
+                snapshot = TimetableScheduler.get_snapshot()
+                new_etag = TimetableScheduler.get_timetable_etag(kind, entity_id, snapshot)
+                if new_etag == etag:
+                    db.session.remove()
+                    continue
+                etag = new_etag
+                
+                new_layout = TimetableScheduler.get_slot_grid().digest
+                new_cells = timetable_cells(kind, entity_id, snapshot)
+                if new_layout != layout:
+                    # Cells may have moved; the client must redraw the grid
+                    layout = new_layout
+                    event = self._reset(kind, entity_id, name, etag)
+                else:
+                    changes = [
+                        {'day': day, 'time': time_key, 'course': new_cells.get((day, time_key))}
+                        for day, time_key in sorted(cells.keys() | new_cells.keys())
+                        if cells.get((day, time_key)) != new_cells.get((day, time_key))
+                    ]
+                    event = format_event('patch', {'changes': changes}, etag)
+                cells = new_cells
+                db.session.remove()
+                yield event
+        finally:
+            self.unsubscribe(subscription)
+    
+    @staticmethod
+    def _reset(kind, entity_id, name, etag):
+        timetable = getattr(TimetableScheduler, f'get_timetable_for_{kind}')(entity_id)
+        return format_event('reset', timetable_document(kind, entity_id, name, timetable), etag)
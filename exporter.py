@@ -0,0 +1,294 @@
+# exporter.py
+import csv
+import io
+import os
+from functools import lru_cache
+from datetime import datetime, date, timedelta, timezone
+from itertools import chain, groupby
+from zoneinfo import ZoneInfo
+
+from sqlalchemy import case
+
+from models import db, Course, Faculty, Division, Room, TimeSlot
+
+DAY_INDEX = {
+    'Monday': 0, 'Tuesday': 1, 'Wednesday': 2, 'Thursday': 3,
+    'Friday': 4, 'Saturday': 5, 'Sunday': 6
+}
+
+CSV_HEADER = ['course_id', 'course_name', 'day', 'start_time', 'end_time',
+              'room', 'faculty', 'division', 'faculty_id', 'division_id']
+
+def timetable_query(faculty_id=None, division_id=None, room_id=None):
+    """
+    Build the single joined, column-only query behind every timetable read.
+    
+    Rows are plain tuples, so no ORM instances are created and no
+    relationship is lazily loaded per course. The first ten columns are in
+    CSV_HEADER order; the time slot ID follows. Columns are labelled id,
+    name, day, start_time, end_time, room, faculty, division, faculty_id,
+    division_id and time_slot_id.
+    
+    Args:
+        faculty_id: Only include this faculty's courses
+        division_id: Only include this division's courses
+        room_id: Only include courses in this room
+    """
+    query = db.session.query(
+        Course.id, Course.name, TimeSlot.day, TimeSlot.start_time, TimeSlot.end_time,
+        Room.name.label('room'), Faculty.name.label('faculty'), Division.name.label('division'),
+        Course.faculty_id, Course.division_id, Course.time_slot_id
+    ).join(TimeSlot, Course.time_slot_id == TimeSlot.id) \
+     .join(Room, Course.room_id == Room.id) \
+     .join(Faculty, Course.faculty_id == Faculty.id) \
+     .join(Division, Course.division_id == Division.id)
+    
+    if faculty_id is not None:
+        query = query.filter(Course.faculty_id == int(faculty_id))
+    if division_id is not None:
+        query = query.filter(Course.division_id == int(division_id))
+    if room_id is not None:
+        query = query.filter(Course.room_id == int(room_id))
+    return query
+
+def timetable_rows(faculty_id=None, division_id=None, group_by=None, batch_size=1000):
+    """
+    Stream timetable rows from timetable_query() in timetable order.
+    
+    Args:
+        faculty_id: Only export this faculty's courses
+        division_id: Only export this division's courses
+        group_by: 'faculty' or 'division' to order rows by that entity first
+        batch_size: Rows fetched per round-trip
+    
+    Yields:
+        Row tuples in CSV_HEADER order, with times as datetime.time,
+        followed by the time slot ID
+    """
+    query = timetable_query(faculty_id, division_id)
+    
+    order = []
+    if group_by == 'faculty':
+        order.append(Course.faculty_id)
+    elif group_by == 'division':
+        order.append(Course.division_id)
+    order.extend([case(DAY_INDEX, value=TimeSlot.day, else_=len(DAY_INDEX)),
+                  TimeSlot.start_time, Course.id])
+    
+    return query.order_by(*order).yield_per(batch_size)
+
+def iter_csv(rows):
+    """Yield the rows as CSV text, one line at a time."""
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    
+    def flush():
+        value = buffer.getvalue()
+        buffer.seek(0)
+        buffer.truncate(0)
+        return value
+    
+    writer.writerow(CSV_HEADER)
+    yield flush()
+    for row in rows:
+        writer.writerow([
+            row[0], row[1], row[2], row[3].strftime('%H:%M'), row[4].strftime('%H:%M'),
+            row[5], row[6], row[7], row[8], row[9]
+        ])
+        yield flush()
+
+def timetable_document(kind, entity_id, name, timetable):
+    """
+    Build the JSON document for a timetable matrix.
+    
+    Lists keep the day and time order that JSON objects would lose.
+    
+    Args:
+        kind: 'faculty', 'division' or 'room'
+        entity_id: ID of the faculty, division or room
+        name: Display name of the entity
+        timetable: Matrix from TimetableScheduler.build_timetable_matrix()
+    
+    Returns:
+        dict: The document, ready for json.dumps()
+    """
+    return {
+        'kind': kind,
+        'id': int(entity_id),
+        'name': name,
+        'days': [
+            {
+                'day': day,
+                'slots': [{'time': time_key, 'course': course}
+                          for time_key, course in time_slots.items()]
+            }
+            for day, time_slots in timetable.items()
+        ]
+    }
+
+def term_start_date(value=None):
+    """Parse a YYYY-MM-DD term start, defaulting to the Monday of this week."""
+    if value:
+        return datetime.strptime(value, '%Y-%m-%d').date()
+    today = date.today()
+    return today - timedelta(days=today.weekday())
+
+def _ics_escape(text):
+    return (str(text).replace('\\', '\\\\').replace(';', '\\;')
+            .replace(',', '\\,').replace('\n', '\\n'))
+
+def _ics_lines(*lines):
+    """
+    Join content lines with CRLF, folding each at 75 octets (RFC 5545 3.1).
+    
+    Continuation lines start with a space, and a UTF-8 character is never
+    split across two lines.
+    """
+    folded = []
+    for line in lines:
+        limit = 75
+        while len(line.encode('utf-8')) > limit:
+            cut = limit
+            while len(line[:cut].encode('utf-8')) > limit:
+                cut -= 1
+            folded.append(line[:cut])
+            line = ' ' + line[cut:]
+        folded.append(line)
+    return ''.join(line + '\r\n' for line in folded)
+
+def _ics_offset(offset):
+    minutes = int(offset.total_seconds()) // 60
+    sign = '-' if minutes < 0 else '+'
+    return f'{sign}{abs(minutes) // 60:02d}{abs(minutes) % 60:02d}'
+
+@lru_cache(maxsize=64)
+def ics_timezone(tzid, first_year, last_year):
+    """
+    Build a VTIMEZONE component for an IANA time zone.
+    
+    Each UTC offset change between first_year and last_year is written as
+    its own observance, found from the zone database, so the component
+    needs no recurrence rules. Finding them walks every day of the range,
+    so components are memoized per (tzid, first_year, last_year).
+    
+    Args:
+        tzid: IANA time zone name, e.g. 'Europe/Berlin'
+        first_year: First year the calendar's events fall in
+        last_year: Last year the calendar's events fall in
+    
+    Returns:
+        str: The component's folded content lines
+    """
+    zone = ZoneInfo(tzid)
+    
+    def observance(moment, offset_from):
+        local = moment.astimezone(zone)
+        kind = 'DAYLIGHT' if local.dst() else 'STANDARD'
+        return [f'BEGIN:{kind}',
+                f"DTSTART:{(moment + offset_from).strftime('%Y%m%dT%H%M%S')}",
+                f'TZOFFSETFROM:{_ics_offset(offset_from)}',
+                f'TZOFFSETTO:{_ics_offset(local.utcoffset())}',
+                f'TZNAME:{_ics_escape(local.tzname())}',
+                f'END:{kind}']
+    
+    # Walk the years a day at a time and bisect each day whose offset
+    # differs from the previous one down to the minute of the change
+    moment = datetime(first_year, 1, 1, tzinfo=timezone.utc)
+    end = datetime(last_year + 1, 1, 1, tzinfo=timezone.utc)
+    offset = moment.astimezone(zone).utcoffset()
+    lines = ['BEGIN:VTIMEZONE', f'TZID:{tzid}'] + observance(moment, offset)
+    while moment < end:
+        day_end = moment + timedelta(days=1)
+        if day_end.astimezone(zone).utcoffset() != offset:
+            low, high = moment, day_end
+            while high - low > timedelta(minutes=1):
+                middle = low + (high - low) / 2
+                if middle.astimezone(zone).utcoffset() == offset:
+                    low = middle
+                else:
+                    high = middle
+            high = high.replace(second=0, microsecond=0)
+            lines += observance(high, offset)
+            offset = high.astimezone(zone).utcoffset()
+        moment = day_end
+    lines.append('END:VTIMEZONE')
+    return _ics_lines(*lines)
+
+def iter_ics(rows, calendar_name, term_start, weeks=None, tzid='UTC'):
+    """
+    Yield an iCalendar document with one weekly recurring event per course.
+    
+    Event times are local to tzid, which is described by a VTIMEZONE
+    component, so calendar clients in other time zones show them correctly
+    and weekly repeats keep their wall-clock time across DST changes.
+    
+    Args:
+        rows: Rows from timetable_rows()
+        calendar_name: Display name of the calendar
+        term_start: First date of the term; each event starts on the first
+            matching weekday on or after it
+        weeks: Number of weekly occurrences, at least 1, or None to
+            repeat indefinitely
+        tzid: IANA time zone of the time slots
+    """
+    if weeks is not None and weeks < 1:
+        raise ValueError(f'weeks must be at least 1, not {weeks}')
+    stamp = datetime.utcnow().strftime('%Y%m%dT%H%M%SZ')
+    # An open-ended calendar describes the time zone for five years
+    last_day = term_start + timedelta(weeks=5 * 52 if weeks is None else weeks)
+    yield _ics_lines('BEGIN:VCALENDAR',
+                     'VERSION:2.0',
+                     'PRODID:-//Timetable Scheduling System//EN',
+                     'CALSCALE:GREGORIAN',
+                     f'X-WR-CALNAME:{_ics_escape(calendar_name)}',
+                     f'X-WR-TIMEZONE:{tzid}')
+    yield ics_timezone(tzid, term_start.year, last_day.year)
+    
+    rule = 'RRULE:FREQ=WEEKLY' + ('' if weeks is None else f';COUNT={int(weeks)}')
+    for row in rows:
+        offset = (DAY_INDEX.get(row[2], 0) - term_start.weekday()) % 7
+        first_day = term_start + timedelta(days=offset)
+        start = datetime.combine(first_day, row[3]).strftime('%Y%m%dT%H%M%S')
+        end = datetime.combine(first_day, row[4]).strftime('%Y%m%dT%H%M%S')
+        yield _ics_lines('BEGIN:VEVENT',
+                         f'UID:course-{row[0]}@timetable',
+                         f'DTSTAMP:{stamp}',
+                         f'DTSTART;TZID={tzid}:{start}',
+                         f'DTEND;TZID={tzid}:{end}',
+                         rule,
+                         f'SUMMARY:{_ics_escape(row[1])}',
+                         f'LOCATION:{_ics_escape(row[5])}',
+                         f'DESCRIPTION:{_ics_escape(f"Faculty: {row[6]} / Division: {row[7]}")}',
+                         'END:VEVENT')
+    
+    yield _ics_lines('END:VCALENDAR')
+
+def write_calendars(directory, kind, term_start, weeks=None, tzid='UTC'):
+    """
+    Write one .ics file per faculty or division from a single ordered query.
+    
+    Args:
+        directory: Output directory, created if needed
+        kind: 'faculty' or 'division'
+        term_start: First date of the term
+        weeks: Number of weekly occurrences, or None
+        tzid: IANA time zone of the time slots
+    
+    Returns:
+        int: Number of calendars written
+    """
+    os.makedirs(directory, exist_ok=True)
+    key_index = 8 if kind == 'faculty' else 9
+    name_index = 6 if kind == 'faculty' else 7
+    
+    count = 0
+    rows = timetable_rows(group_by=kind)
+    for entity_id, group in groupby(rows, key=lambda row: row[key_index]):
+        first = next(group)
+        group = chain([first], group)
+        path = os.path.join(directory, f'{kind}-{entity_id}.ics')
+        with open(path, 'w', encoding='utf-8', newline='') as handle:
+            for chunk in iter_ics(group, first[name_index], term_start, weeks, tzid):
+                handle.write(chunk)
+        count += 1
+    return count
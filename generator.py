@@ -0,0 +1,228 @@
+# generator.py
+import heapq
+from collections import defaultdict
+
+from models import db, Course, Room, TimeSlot
+from utils import OccupancyMatrix, TimetableScheduler
+
+class CourseDemand:
+    """A course to be placed automatically, with its resource requirements."""
+    def __init__(self, name, faculty_id, division_id, sessions=1, room_id=None,
+                 is_lab=None, min_capacity=0):
+        self.name = name
+        self.faculty_id = int(faculty_id)
+        self.division_id = int(division_id)
+        # Number of weekly sessions to place
+        self.sessions = int(sessions)
+        # Room requirements: a fixed room, or any room matching lab/capacity
+        self.room_id = int(room_id) if room_id is not None else None
+        self.is_lab = is_lab
+        self.min_capacity = int(min_capacity or 0)
+    
+    @classmethod
+    def from_dict(cls, data):
+        """Create a demand from a JSON-style dictionary."""
+        return cls(
+            data['name'],
+            data['faculty_id'],
+            data['division_id'],
+            sessions=data.get('sessions', 1),
+            room_id=data.get('room_id'),
+            is_lab=data.get('is_lab'),
+            min_capacity=data.get('min_capacity', 0)
+        )
+    
+    def __repr__(self):
+        return f'<CourseDemand {self.name}>'
+
+class GenerationResult:
+    """Placements produced by the generator and the sessions it could not place."""
+    def __init__(self):
+        # Dictionaries ready for Course bulk inserts
+        self.placements = []
+        # Dictionaries with the demand, session number and reason
+        self.unplaced = []
+    
+    @property
+    def complete(self):
+        return not self.unplaced
+
+class TimetableGenerator:
+    """
+    Whole-term timetable generator using DSATUR graph coloring.
+    
+    Every weekly session of every demand is a vertex; sessions sharing a
+    faculty or a division are adjacent and the colors are time slots. Rooms
+    are assigned when a vertex is colored, best-fit by capacity. Courses
+    already in the database are treated as precolored, so the generator can
+    fill a partially built timetable.
+    """
+    
+    def __init__(self, demands):
+        """
+        Args:
+            demands: List of CourseDemand objects (or dictionaries)
+        """
+        self.demands = [
+            demand if isinstance(demand, CourseDemand) else CourseDemand.from_dict(demand)
+            for demand in demands
+        ]
+    
+    def _load_state(self):
+        """Copy the snapshot occupancy so generation never mutates the live indexes."""
+        occupancy = TimetableScheduler.get_snapshot().occupancy
+        
+        self.faculty_busy = defaultdict(int, occupancy.busy['faculty'])
+        self.division_busy = defaultdict(int, occupancy.busy['division'])
+        self.slot_rooms = defaultdict(int, occupancy.slot_rooms)
+        
+        self.slot_days = dict(db.session.query(TimeSlot.id, TimeSlot.day))
+        self.all_slots = OccupancyMatrix.mask_of(self.slot_days)
+        # Classrooms before labs, smallest first, so the first free match is
+        # the best fit and labs are kept for the demands that need them
+        self.rooms = db.session.query(Room.id, Room.capacity, Room.is_lab).order_by(
+            Room.is_lab, Room.capacity, Room.id
+        ).all()
+        self._room_options = {}
+    
+    def _rooms_for(self, demand):
+        """Return the IDs of rooms meeting a demand's requirements, best fit first."""
+        key = (demand.room_id, demand.is_lab, demand.min_capacity)
+        if key not in self._room_options:
+            self._room_options[key] = [
+                room_id for room_id, capacity, is_lab in self.rooms
+                if (demand.room_id is None or room_id == demand.room_id)
+                and (demand.is_lab is None or bool(is_lab) == bool(demand.is_lab))
+                and (capacity or 0) >= demand.min_capacity
+            ]
+        return self._room_options[key]
+    
+    def _saturation(self, demand):
+        """Number of distinct slots already taken by the vertex's neighbors."""
+        return bin(self.faculty_busy[demand.faculty_id] | self.division_busy[demand.division_id]).count('1')
+    
+    def _place(self, demand, used_days):
+        """
+        Pick a (slot, room) for one session of a demand.
+        
+        Slots on days the demand does not use yet are preferred, then the
+        lowest slot ID, as in plain DSATUR.
+        
+        Returns:
+            tuple: (time_slot_id, room_id), or None if no placement exists
+        """
+        free = self.all_slots & ~(self.faculty_busy[demand.faculty_id] |
+                                  self.division_busy[demand.division_id])
+        fallback = None
+        for slot_id in OccupancyMatrix.bits(free):
+            busy_rooms = self.slot_rooms[slot_id]
+            room_id = next(
+                (room_id for room_id in self._rooms_for(demand) if not busy_rooms >> room_id & 1),
+                None
+            )
+            if room_id is None:
+                continue
+            if self.slot_days.get(slot_id) not in used_days:
+                return slot_id, room_id
+            if fallback is None:
+                fallback = (slot_id, room_id)
+        return fallback
+    
+    def generate(self):
+        """
+        Assign a time slot and room to every session.
+        
+        Returns:
+            GenerationResult: Placements and unplaced sessions
+        """
+        self._load_state()
+        result = GenerationResult()
+        
+        # Expand demands into session vertices
+        vertices = []
+        faculty_groups = defaultdict(list)
+        division_groups = defaultdict(list)
+        for demand in self.demands:
+            if not self._rooms_for(demand):
+                for session in range(1, demand.sessions + 1):
+                    result.unplaced.append({'demand': demand, 'session': session,
+                                            'reason': 'No room meets the requirements'})
+                continue
+            for session in range(1, demand.sessions + 1):
+                index = len(vertices)
+                vertices.append((demand, session))
+                faculty_groups[demand.faculty_id].append(index)
+                division_groups[demand.division_id].append(index)
+        
+        # Max-heap on (saturation, degree) using lazy deletion of stale entries
+        degrees = [
+            len(faculty_groups[demand.faculty_id]) + len(division_groups[demand.division_id]) - 2
+            for demand, _ in vertices
+        ]
+        saturation = [self._saturation(demand) for demand, _ in vertices]
+        heap = [(-saturation[i], -degrees[i], i) for i in range(len(vertices))]
+        heapq.heapify(heap)
+        done = [False] * len(vertices)
+        used_days = defaultdict(set)
+        
+        while heap:
+            neg_saturation, _, index = heapq.heappop(heap)
+            if done[index] or -neg_saturation != saturation[index]:
+                continue
+            done[index] = True
+            demand, session = vertices[index]
+            
+            placement = self._place(demand, used_days[id(demand)])
+            if placement is None:
+                result.unplaced.append({'demand': demand, 'session': session,
+                                        'reason': 'No free slot with a suitable room'})
+                continue
+            
+            slot_id, room_id = placement
+            slot_bit = 1 << slot_id
+            self.faculty_busy[demand.faculty_id] |= slot_bit
+            self.division_busy[demand.division_id] |= slot_bit
+            self.slot_rooms[slot_id] |= 1 << room_id
+            used_days[id(demand)].add(self.slot_days.get(slot_id))
+            result.placements.append({
+                'name': demand.name,
+                'faculty_id': demand.faculty_id,
+                'division_id': demand.division_id,
+                'room_id': room_id,
+                'time_slot_id': slot_id
+            })
+            
+            # Only the neighbors' saturation can change
+            for neighbor in faculty_groups[demand.faculty_id] + division_groups[demand.division_id]:
+                if not done[neighbor]:
+                    new_saturation = self._saturation(vertices[neighbor][0])
+                    if new_saturation != saturation[neighbor]:
+                        saturation[neighbor] = new_saturation
+                        heapq.heappush(heap, (-new_saturation, -degrees[neighbor], neighbor))
+        
+        return result
+    
+    @staticmethod
+    def commit(result):
+        """
+        Write the placements to Course in a single bulk transaction.
+        
+        Args:
+            result: GenerationResult from generate()
+        
+        Returns:
+            int: Number of courses inserted
+        """
+        if not result.placements:
+            return 0
+        
+        try:
+            db.session.bulk_insert_mappings(Course, result.placements)
+            TimetableScheduler.record_changes()
+            db.session.commit()
+        except Exception:
+            db.session.rollback()
+            raise
+        
+        TimetableScheduler.resync()
+        return len(result.placements)
@@ -0,0 +1,288 @@
+# importer.py
+import csv
+import json
+from datetime import datetime
+
+from sqlalchemy.exc import IntegrityError
+
+from models import db, Course, Faculty, Division, Room, TimeSlot
+from utils import ConflictGraph, TimetableScheduler
+
+class ImportReport:
+    """Outcome of a bulk import."""
+    def __init__(self):
+        self.accepted = 0
+        # Dictionaries with the line number, raw row and reason
+        self.rejected = []
+    
+    def reject(self, line, row, reason):
+        self.rejected.append({'line': line, 'row': row, 'reason': reason})
+    
+    def to_dict(self):
+        return {'accepted': self.accepted, 'rejected': self.rejected}
+
+class CourseImporter:
+    """
+    Streaming bulk import of courses from CSV or JSON Lines.
+    
+    Each row names a course and its faculty, division, room and time slot.
+    References may be given by name (faculty username or name, division name,
+    room name, day and start_time) or by ID (faculty_id, division_id, room_id,
+    time_slot_id). Rows are read one at a time, resolved through in-memory
+    lookups and checked against the live conflict index plus the rows
+    already accepted in the batch. Accepted rows are bulk inserted in one
+    transaction; rejected rows are collected in the report.
+    
+    An importer created with a faculty_id books every row for that faculty
+    member: rows may leave the faculty out, and rows naming anyone else are
+    rejected. The upload route uses this so faculty can only import their
+    own courses.
+    """
+    
+    FORMATS = ('csv', 'jsonl')
+    
+    @staticmethod
+    def format_for(filename):
+        """Guess the import format from a file name."""
+        return 'csv' if filename.lower().endswith('.csv') else 'jsonl'
+    
+    def __init__(self, batch_size=1000, faculty_id=None):
+        # Accepted rows are flushed in chunks of this size before the commit
+        self.batch_size = batch_size
+        # Faculty member every row is booked for, or None to take it from the rows
+        self.faculty_id = faculty_id
+    
+    def _load_lookups(self):
+        """Load name -> ID maps for the reference tables with column-only queries."""
+        self.faculty_ids = {}
+        names = {}
+        for faculty_id, username, name in db.session.query(Faculty.id, Faculty.username, Faculty.name):
+            self.faculty_ids[username] = faculty_id
+            # Display names are only usable when unambiguous
+            names[name] = None if name in names else faculty_id
+        for name, faculty_id in names.items():
+            if faculty_id is not None:
+                self.faculty_ids.setdefault(name, faculty_id)
+        self.known_faculty = set(self.faculty_ids.values())
+        
+        self.division_ids = dict(db.session.query(Division.name, Division.id))
+        self.room_ids = dict(db.session.query(Room.name, Room.id))
+        self.slot_ids = {
+            (day.lower(), start_time.strftime('%H:%M')): slot_id
+            for slot_id, day, start_time in db.session.query(TimeSlot.id, TimeSlot.day, TimeSlot.start_time)
+        }
+        self.known_divisions = set(self.division_ids.values())
+        self.known_rooms = set(self.room_ids.values())
+        self.known_slots = set(self.slot_ids.values())
+    
+    @staticmethod
+    def read_rows(stream, fmt='csv'):
+        """
+        Yield (line_number, row) pairs from a text stream without loading it whole.
+        
+        Args:
+            stream: Text file object
+            fmt: 'csv' (with a header row) or 'jsonl' (one JSON object per line)
+        """
+        if fmt == 'csv':
+            reader = csv.DictReader(stream)
+            for row in reader:
+                yield reader.line_num, row
+        elif fmt == 'jsonl':
+            for line_number, line in enumerate(stream, start=1):
+                if line.strip():
+                    try:
+                        yield line_number, json.loads(line)
+                    except ValueError:
+                        yield line_number, None
+        else:
+            raise ValueError(f"Unsupported import format: {fmt}")
+    
+    @staticmethod
+    def _value(row, key):
+        value = row.get(key)
+        if isinstance(value, str):
+            value = value.strip()
+        return value if value not in (None, '') else None
+    
+    def _resolve_id(self, row, name_key, id_key, lookup, known_ids):
+        """Resolve a reference by ID column or by name, returning None if unknown."""
+        value = self._value(row, id_key)
+        if value is not None:
+            try:
+                value = int(value)
+            except (TypeError, ValueError):
+                return None
+            return value if value in known_ids else None
+        name = self._value(row, name_key)
+        return lookup.get(name) if isinstance(name, str) else None
+    
+    def _resolve_slot(self, row):
+        value = self._value(row, 'time_slot_id')
+        if value is not None:
+            try:
+                value = int(value)
+            except (TypeError, ValueError):
+                return None
+            return value if value in self.known_slots else None
+        day = self._value(row, 'day')
+        start_time = self._value(row, 'start_time')
+        if not isinstance(day, str) or start_time is None:
+            return None
+        try:
+            start_time = datetime.strptime(str(start_time), '%H:%M').strftime('%H:%M')
+        except ValueError:
+            return None
+        return self.slot_ids.get((day.lower(), start_time))
+    
+    def _resolve(self, row):
+        """
+        Turn a raw row into Course column values.
+        
+        Returns:
+            tuple: (values dict or None, reason for rejection or None)
+        """
+        if not isinstance(row, dict):
+            return None, 'Malformed row'
+        
+        name = self._value(row, 'course_name') or self._value(row, 'name')
+        if name is None:
+            return None, 'Missing course name'
+        
+        faculty_id = self._resolve_id(row, 'faculty', 'faculty_id',
+                                      self.faculty_ids, self.known_faculty)
+        if self.faculty_id is not None:
+            named = self._value(row, 'faculty_id') is not None or self._value(row, 'faculty') is not None
+            if named and faculty_id != self.faculty_id:
+                return None, 'Courses can only be imported for yourself'
+            faculty_id = self.faculty_id
+        
+        values = {
+            'name': str(name),
+            'faculty_id': faculty_id,
+            'division_id': self._resolve_id(row, 'division', 'division_id',
+                                            self.division_ids, self.known_divisions),
+            'room_id': self._resolve_id(row, 'room', 'room_id', self.room_ids, self.known_rooms),
+            'time_slot_id': self._resolve_slot(row)
+        }
+        for field in ('faculty_id', 'division_id', 'room_id', 'time_slot_id'):
+            if values[field] is None:
+                return None, f"Unknown or missing {field[:-3].replace('_', ' ')}"
+        return values, None
+    
+    @staticmethod
+    def _candidate(values):
+        """Wrap resolved column values for the conflict checks."""
+        return type('ImportCourse', (), dict(values, id=-1))
+    
+    def _retry(self, accepted, report, error):
+        """
+        Save the accepted rows again after the unique indexes refused one.
+        
+        Another request may book a slot between the conflict check and the
+        commit. The indexes are caught up with such bookings, the rows that
+        now conflict are rejected, and the rest are saved in a new
+        transaction, until a save succeeds. If no row conflicts, the error
+        had another cause and every row is rejected with it.
+        
+        Args:
+            accepted: (line, row, values) of the rows to save
+            report: ImportReport to record the rejections in
+            error: The IntegrityError of the failed save
+        """
+        while accepted:
+            TimetableScheduler.refresh()
+            graph = TimetableScheduler.get_snapshot().conflict_graph
+            remaining = []
+            for line, row, values in accepted:
+                if graph.would_create_conflict(self._candidate(values)):
+                    report.reject(line, row, 'Conflicts with an existing course')
+                else:
+                    remaining.append((line, row, values))
+            if len(remaining) == len(accepted):
+                for line, row, _ in accepted:
+                    report.reject(line, row, f'Not saved: {error.orig}')
+                remaining = []
+            accepted = remaining
+            report.accepted = len(accepted)
+            if not accepted:
+                break
+            
+            try:
+                for start in range(0, len(accepted), self.batch_size):
+                    db.session.bulk_insert_mappings(
+                        Course, [values for _, _, values in accepted[start:start + self.batch_size]]
+                    )
+                TimetableScheduler.record_changes()
+                db.session.commit()
+                break
+            except IntegrityError as retry_error:
+                db.session.rollback()
+                error = retry_error
+        report.rejected.sort(key=lambda rejection: rejection['line'])
+    
+    def import_stream(self, stream, fmt='csv', dry_run=False):
+        """
+        Import courses from a text stream.
+        
+        Args:
+            stream: Text file object
+            fmt: 'csv' or 'jsonl'
+            dry_run: Validate and report without saving anything
+        
+        Returns:
+            ImportReport: Accepted count and rejected rows
+        """
+        self._load_lookups()
+        
+        graph = TimetableScheduler.get_snapshot().conflict_graph
+        # Occupancy keys claimed by rows accepted earlier in this batch
+        batch_keys = set()
+        # (line, row, values) of every accepted row, kept to retry the save
+        accepted = []
+        pending = []
+        report = ImportReport()
+        
+        try:
+            for line, row in self.read_rows(stream, fmt):
+                values, reason = self._resolve(row)
+                if values is None:
+                    report.reject(line, row, reason)
+                    continue
+                
+                candidate = self._candidate(values)
+                keys = ConflictGraph.resource_keys(candidate)
+                if graph.would_create_conflict(candidate):
+                    report.reject(line, row, 'Conflicts with an existing course')
+                    continue
+                if any(key in batch_keys for key in keys):
+                    report.reject(line, row, 'Conflicts with an earlier row in this import')
+                    continue
+                
+                batch_keys.update(keys)
+                accepted.append((line, row, values))
+                pending.append(values)
+                report.accepted += 1
+                if len(pending) >= self.batch_size and not dry_run:
+                    db.session.bulk_insert_mappings(Course, pending)
+                    pending = []
+            
+            if dry_run:
+                db.session.rollback()
+                return report
+            
+            if pending:
+                db.session.bulk_insert_mappings(Course, pending)
+            if report.accepted:
+                TimetableScheduler.record_changes()
+            db.session.commit()
+        except IntegrityError as error:
+            db.session.rollback()
+            self._retry(accepted, report, error)
+        except Exception:
+            db.session.rollback()
+            raise
+        
+        if report.accepted:
+            TimetableScheduler.resync()
+        return report
@@ -0,0 +1,220 @@
+# metrics.py
+"""
+Request instrumentation and Prometheus metrics.
+
+Every request records its duration, the number of SQL statements it issued
+and the time they took (from SQLAlchemy cursor events), the time spent
+rendering templates and the time spent in each TimetableScheduler operation
+(from the timed() decorator). The results are kept as histograms in this
+process and rendered in the Prometheus text format by render(). Recording
+is a few perf_counter() calls and a short locked update per event, so it
+can stay on in production.
+
+Each worker process keeps its own histograms; Prometheus should scrape
+every worker, or the application should run as one process per target.
+"""
+import bisect
+import functools
+import threading
+import time
+
+from flask import request
+from jinja2 import Template
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+
+# Bucket upper bounds in seconds, and in statements for the SQL count
+REQUEST_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+OPERATION_BUCKETS = (0.00001, 0.00005, 0.0001, 0.0005, 0.001, 0.005, 0.01, 0.05, 0.1, 0.5, 1, 5)
+STATEMENT_BUCKETS = (0, 1, 2, 3, 5, 10, 20, 50, 100, 500)
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+class Histogram:
+    """A Prometheus histogram with a fixed set of label names."""
+    def __init__(self, name, documentation, buckets, labelnames=()):
+        self.name = name
+        self.documentation = documentation
+        self.buckets = tuple(buckets)
+        self.labelnames = tuple(labelnames)
+        self._lock = threading.Lock()
+        # Label values -> [per-bucket counts (last is +Inf), sum]
+        self._series = {}
+    
+    def observe(self, value, *labels):
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(labels)
+            if series is None:
+                series = self._series[labels] = [[0] * (len(self.buckets) + 1), 0.0]
+            series[0][index] += 1
+            series[1] += value
+    
+    def render(self):
+        """Return the histogram's lines in the Prometheus text format."""
+        lines = [f'# HELP {self.name} {self.documentation}', f'# TYPE {self.name} histogram']
+        with self._lock:
+            series = sorted((labels, list(counts), total)
+                            for labels, (counts, total) in self._series.items())
+        
+        for labels, counts, total in series:
+            pairs = [f'{name}="{_escape(value)}"' for name, value in zip(self.labelnames, labels)]
+            cumulative = 0
+            for bound, count in zip(self.buckets + ('+Inf',), counts):
+                cumulative += count
+                label_text = ','.join(pairs + [f'le="{bound}"'])
+                lines.append(f'{self.name}_bucket{{{label_text}}} {cumulative}')
+            label_text = '{' + ','.join(pairs) + '}' if pairs else ''
+            lines.append(f'{self.name}_sum{label_text} {total}')
+            lines.append(f'{self.name}_count{label_text} {cumulative}')
+        return lines
+
+REQUEST_SECONDS = Histogram(
+    'timetable_request_duration_seconds', 'Time to handle a request.',
+    REQUEST_BUCKETS, ('endpoint', 'method', 'status')
+)
+REQUEST_SQL_STATEMENTS = Histogram(
+    'timetable_request_sql_statements', 'SQL statements issued per request.',
+    STATEMENT_BUCKETS, ('endpoint',)
+)
+REQUEST_SQL_SECONDS = Histogram(
+    'timetable_request_sql_seconds', 'Time spent executing SQL per request.',
+    REQUEST_BUCKETS, ('endpoint',)
+)
+TEMPLATE_SECONDS = Histogram(
+    'timetable_template_render_seconds', 'Time to render a template.',
+    REQUEST_BUCKETS, ('template',)
+)
+SCHEDULER_SECONDS = Histogram(
+    'timetable_scheduler_operation_seconds', 'Time spent in a TimetableScheduler operation.',
+    OPERATION_BUCKETS, ('operation',)
+)
+HISTOGRAMS = (REQUEST_SECONDS, REQUEST_SQL_STATEMENTS, REQUEST_SQL_SECONDS,
+              TEMPLATE_SECONDS, SCHEDULER_SECONDS)
+
+def render():
+    """Render every metric in the Prometheus text format."""
+    return '\n'.join(line for histogram in HISTOGRAMS for line in histogram.render()) + '\n'
+
+class RequestMetrics:
+    """Totals for the request being handled by this thread."""
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.statements = 0
+        self.sql_seconds = 0.0
+        self.render_seconds = 0.0
+        self.operations = {}  # Operation name -> [calls, seconds]
+    
+    def add_operation(self, name, seconds):
+        totals = self.operations.setdefault(name, [0, 0.0])
+        totals[0] += 1
+        totals[1] += seconds
+    
+    def summary(self, limit=5):
+        """
+        Describe the slowest scheduler operations, for the slow-request log.
+        Nested operations are also counted in the operations that call them.
+        """
+        slowest = sorted(self.operations.items(), key=lambda item: -item[1][1])[:limit]
+        return ', '.join(f'{name} {calls}x {seconds * 1000:.1f} ms'
+                         for name, (calls, seconds) in slowest) or 'none'
+
+# A thread-local rather than flask.g: the context proxies would cost more
+# than the timing itself on the hottest scheduler calls
+class _RequestState(threading.local):
+    request_metrics = None  # Class default, so lookups never raise
+
+_local = _RequestState()
+
+def current_request_metrics():
+    """Get the current request's RequestMetrics, or None outside a request."""
+    return _local.request_metrics
+
+def timed(func):
+    """Record the time of each call to a scheduler operation."""
+    name = func.__name__.lstrip('_')
+    
+    @functools.wraps(func)
+    def wrapper(*args, **kwargs):
+        start = time.perf_counter()
+        try:
+            return func(*args, **kwargs)
+        finally:
+            elapsed = time.perf_counter() - start
+            SCHEDULER_SECONDS.observe(elapsed, name)
+            state = current_request_metrics()
+            if state is not None:
+                state.add_operation(name, elapsed)
+    return wrapper
+
+class TimedTemplate(Template):
+    """Jinja template class that records its render time."""
+    def render(self, *args, **kwargs):
+        start = time.perf_counter()
+        try:
+            return super().render(*args, **kwargs)
+        finally:
+            elapsed = time.perf_counter() - start
+            TEMPLATE_SECONDS.observe(elapsed, self.name or 'string')
+            state = current_request_metrics()
+            if state is not None:
+                state.render_seconds += elapsed
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    conn.info['metrics_query_start'] = time.perf_counter()
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    start = conn.info.pop('metrics_query_start', None)
+    state = current_request_metrics()
+    if state is not None and start is not None:
+        state.statements += 1
+        state.sql_seconds += time.perf_counter() - start
+
+def init_app(app):
+    """
+    Instrument an application.
+    
+    Call this before registering other before_request hooks, so their time
+    is part of the request. SQL is counted on every engine, including ones
+    Flask-SQLAlchemy recreates. If app.config['SLOW_REQUEST_SECONDS'] is
+    set, requests slower than that are logged with their breakdown.
+    """
+    app.jinja_env.template_class = TimedTemplate
+    if not event.contains(Engine, 'before_cursor_execute', _before_cursor_execute):
+        event.listen(Engine, 'before_cursor_execute', _before_cursor_execute)
+        event.listen(Engine, 'after_cursor_execute', _after_cursor_execute)
+    
+    @app.before_request
+    def start_request_metrics():
+        _local.request_metrics = RequestMetrics()
+    
+    @app.teardown_request
+    def end_request_metrics(exception=None):
+        _local.request_metrics = None
+    
+    # Registered first, so it runs after every other after_request hook
+    @app.after_request
+    def record_request_metrics(response):
+        state = current_request_metrics()
+        if state is None:
+            return response
+        elapsed = time.perf_counter() - state.started
+        endpoint = request.endpoint or 'unmatched'
+        
+        REQUEST_SECONDS.observe(elapsed, endpoint, request.method, str(response.status_code))
+        REQUEST_SQL_STATEMENTS.observe(state.statements, endpoint)
+        REQUEST_SQL_SECONDS.observe(state.sql_seconds, endpoint)
+        
+        threshold = app.config.get('SLOW_REQUEST_SECONDS')
+        if threshold is not None and elapsed >= threshold:
+            app.logger.warning(
+                'Slow request: %s %s -> %s in %.1f ms; %d SQL statements in %.1f ms; '
+                'templates %.1f ms; scheduler: %s',
+                request.method, request.full_path.rstrip('?'), response.status_code,
+                elapsed * 1000, state.statements, state.sql_seconds * 1000,
+                state.render_seconds * 1000, state.summary()
+            )
+        return response
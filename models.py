@@ -3,6 +3,7 @@ from flask_sqlalchemy import SQLAlchemy
 from flask_login import UserMixin
 from werkzeug.security import generate_password_hash, check_password_hash
 from datetime import datetime
+from sqlalchemy.exc import IntegrityError
 
 db = SQLAlchemy()
 
@@ -58,6 +59,17 @@ class TimeSlot(db.Model):
 
 class Course(db.Model):
     """Course model for storing course details and scheduling information."""
+    # A room, faculty or division can hold at most one course per time slot.
+    # Unique indexes (rather than table constraints) can also be added to an
+    # existing table, see ensure_indexes(). The resource column comes first
+    # so the same indexes serve the per-faculty, per-division and per-room
+    # timetable queries.
+    __table_args__ = (
+        db.Index('uq_course_room_slot', 'room_id', 'time_slot_id', unique=True),
+        db.Index('uq_course_faculty_slot', 'faculty_id', 'time_slot_id', unique=True),
+        db.Index('uq_course_division_slot', 'division_id', 'time_slot_id', unique=True),
+    )
+    
     id = db.Column(db.Integer, primary_key=True)
     name = db.Column(db.String(100), nullable=False)
     faculty_id = db.Column(db.Integer, db.ForeignKey('faculty.id'), nullable=False)
@@ -68,3 +80,55 @@ class Course(db.Model):
     
     def __repr__(self):
         return f'<Course {self.name}>'
+
+class CourseChange(db.Model):
+    """Append-only log of Course writes, used to keep every worker process's in-memory indexes current."""
+    # AUTOINCREMENT keeps IDs increasing even if old rows are deleted, so the
+    # latest ID can serve as the schedule generation
+    __table_args__ = {'sqlite_autoincrement': True}
+    
+    id = db.Column(db.Integer, primary_key=True)
+    # None marks a bulk write whose course IDs are unknown
+    course_id = db.Column(db.Integer)
+    # Rows older than Config.CHANGE_LOG_RETENTION_SECONDS are pruned
+    changed_at = db.Column(db.DateTime, default=datetime.utcnow, index=True)
+    
+    def __repr__(self):
+        return f'<CourseChange {self.id} course={self.course_id}>'
+
+class ReferenceChange(db.Model):
+    """Append-only log of Faculty, Room, Division and TimeSlot writes, read by every worker process's refresh()."""
+    __table_args__ = {'sqlite_autoincrement': True}
+    
+    id = db.Column(db.Integer, primary_key=True)
+    table_name = db.Column(db.String(20), nullable=False)
+    # None marks a write whose row IDs are unknown
+    row_id = db.Column(db.Integer)
+    changed_at = db.Column(db.DateTime, default=datetime.utcnow, index=True)
+    
+    def __repr__(self):
+        return f'<ReferenceChange {self.id} {self.table_name}={self.row_id}>'
+
+def ensure_indexes(engine, logger=None):
+    """
+    Bring the indexes of an existing database up to date.
+    
+    create_all() only creates indexes together with their table, so any
+    model index missing from the database is created here. A unique index
+    that cannot be built because the table already holds clashing rows is
+    skipped with a warning; the in-memory conflict checks still apply to
+    such a database.
+    
+    Returns:
+        list: Names of the indexes that could not be created
+    """
+    skipped = []
+    for table in db.Model.metadata.sorted_tables:
+        for index in table.indexes:
+            try:
+                index.create(engine, checkfirst=True)
+            except IntegrityError:
+                skipped.append(index.name)
+                if logger is not None:
+                    logger.warning(f'Index {index.name} not created: {table.name} holds duplicate rows')
+    return skipped
@@ -0,0 +1,361 @@
+# optimizer.py
+import math
+import random
+import time
+from collections import Counter, defaultdict
+from concurrent.futures import ProcessPoolExecutor
+
+from models import db, Course, Room, TimeSlot
+from utils import TimetableScheduler
+
+class SoftConstraints:
+    """Weights of the soft constraints the optimizer minimizes."""
+    def __init__(self, gap_weight=1.0, load_weight=0.5, late_weight=1.0, late_after='14:00'):
+        # Idle slots between a division's first and last class of a day
+        self.gap_weight = gap_weight
+        # Sum of squared daily loads per faculty, which favors even spreads
+        self.load_weight = load_weight
+        # Classes starting at or after late_after (HH:MM)
+        self.late_weight = late_weight
+        self.late_after = late_after
+
+class OptimizationResult:
+    """Best assignment found across all restarts."""
+    def __init__(self, initial_cost, cost, assignments, seed):
+        self.initial_cost = initial_cost
+        self.cost = cost
+        # Mapping of course ID to its new (time_slot_id, room_id)
+        self.assignments = assignments
+        self.seed = seed
+    
+    @property
+    def changes(self):
+        return len(self.assignments)
+
+class LocalSearch:
+    """
+    Simulated annealing over course (slot, room) assignments.
+    
+    Works on plain tuples so it can run in worker processes. Moves relocate
+    one course; swaps exchange the slots of two courses of the same division.
+    Each candidate is scored by re-evaluating only the (division, day) and
+    (faculty, day) groups it touches. A move is only attempted into cells
+    where the faculty, room and division are all free, so the hard
+    constraints of the conflict graph are never broken.
+    """
+    
+    def __init__(self, problem, weights, seed):
+        """
+        Args:
+            problem: Dictionary with 'courses', 'slots' and 'rooms' tuples
+            weights: SoftConstraints instance
+            seed: Seed for the random number generator
+        """
+        self.weights = weights
+        self.rng = random.Random(seed)
+        
+        # Courses as parallel lists indexed by position
+        self.course_ids = [c[0] for c in problem['courses']]
+        self.faculty = [c[1] for c in problem['courses']]
+        self.division = [c[2] for c in problem['courses']]
+        self.room = [c[3] for c in problem['courses']]
+        self.slot = [c[4] for c in problem['courses']]
+        
+        # Slots: id -> day, position within the day, lateness
+        self.slot_ids = [s[0] for s in problem['slots']]
+        self.slot_day = {s[0]: s[1] for s in problem['slots']}
+        self.slot_position = {s[0]: s[2] for s in problem['slots']}
+        self.slot_late = {s[0]: 1 if s[3] else 0 for s in problem['slots']}
+        
+        # Rooms a course may move to, smallest first: the lab flag and at least
+        # the capacity of the room it was booked in. Courses store no
+        # enrolment, so the booked room stands in for it. The options are
+        # fixed per course, so moves cannot ratchet a course into ever
+        # larger rooms.
+        rooms = {r[0]: r for r in problem['rooms']}
+        room_options = {
+            room_id: [
+                other_id for other_id, capacity, is_lab in sorted(problem['rooms'], key=lambda r: (r[1], r[0]))
+                if bool(is_lab) == bool(room[2]) and (capacity or 0) >= (room[1] or 0)
+            ]
+            for room_id, room in rooms.items()
+        }
+        self.room_options = [room_options.get(room_id, ()) for room_id in self.room]
+        
+        # Hard-constraint occupancy counts and soft-constraint groups
+        self.occupancy = Counter()
+        self.division_days = defaultdict(Counter)
+        self.faculty_days = defaultdict(int)
+        self.by_division = defaultdict(list)
+        for index in range(len(self.course_ids)):
+            self._place(index)
+            self.by_division[self.division[index]].append(index)
+        
+        self.cost = self._total_cost()
+    
+    def _place(self, index):
+        """Add a course's current assignment to the state."""
+        slot_id = self.slot[index]
+        self.occupancy[('faculty', self.faculty[index], slot_id)] += 1
+        self.occupancy[('room', self.room[index], slot_id)] += 1
+        self.occupancy[('division', self.division[index], slot_id)] += 1
+        day = self.slot_day.get(slot_id)
+        self.division_days[(self.division[index], day)][self.slot_position.get(slot_id, 0)] += 1
+        self.faculty_days[(self.faculty[index], day)] += 1
+    
+    def _unplace(self, index):
+        """Remove a course's current assignment from the state."""
+        slot_id = self.slot[index]
+        self.occupancy[('faculty', self.faculty[index], slot_id)] -= 1
+        self.occupancy[('room', self.room[index], slot_id)] -= 1
+        self.occupancy[('division', self.division[index], slot_id)] -= 1
+        day = self.slot_day.get(slot_id)
+        positions = self.division_days[(self.division[index], day)]
+        position = self.slot_position.get(slot_id, 0)
+        positions[position] -= 1
+        if not positions[position]:
+            del positions[position]
+        self.faculty_days[(self.faculty[index], day)] -= 1
+    
+    def _is_free(self, index, slot_id, room_id):
+        """Check the faculty, room and division of a course are free at a cell."""
+        return not (self.occupancy[('faculty', self.faculty[index], slot_id)] or
+                    self.occupancy[('room', room_id, slot_id)] or
+                    self.occupancy[('division', self.division[index], slot_id)])
+    
+    def _free_room(self, index, slot_id):
+        """Return a free room for a course at a slot, preferring its current room."""
+        if self._is_free(index, slot_id, self.room[index]):
+            return self.room[index]
+        for room_id in self.room_options[index]:
+            if self._is_free(index, slot_id, room_id):
+                return room_id
+        return None
+    
+    def _gaps(self, key):
+        positions = self.division_days.get(key)
+        if not positions:
+            return 0
+        return max(positions) - min(positions) + 1 - len(positions)
+    
+    def _group_cost(self, division_keys, faculty_keys):
+        """Soft cost of the given (division, day) and (faculty, day) groups."""
+        return (self.weights.gap_weight * sum(self._gaps(key) for key in division_keys) +
+                self.weights.load_weight * sum(self.faculty_days.get(key, 0) ** 2 for key in faculty_keys))
+    
+    def _total_cost(self):
+        late = sum(self.slot_late.get(slot_id, 0) for slot_id in self.slot)
+        return (self._group_cost(list(self.division_days), list(self.faculty_days)) +
+                self.weights.late_weight * late)
+    
+    def _affected(self, indexes, slot_ids):
+        """Groups touched by moving the given courses to the given slots."""
+        division_keys = set()
+        faculty_keys = set()
+        for index, slot_id in zip(indexes, slot_ids):
+            for day in (self.slot_day.get(self.slot[index]), self.slot_day.get(slot_id)):
+                division_keys.add((self.division[index], day))
+                faculty_keys.add((self.faculty[index], day))
+        return division_keys, faculty_keys
+    
+    def _try_assign(self, indexes, slot_ids, temperature):
+        """
+        Reassign courses to new slots if feasible and accepted.
+        
+        Returns:
+            bool: True if the change was kept
+        """
+        division_keys, faculty_keys = self._affected(indexes, slot_ids)
+        before = self._group_cost(division_keys, faculty_keys)
+        old = [(self.slot[index], self.room[index]) for index in indexes]
+        late_delta = sum(self.slot_late.get(new, 0) - self.slot_late.get(slot, 0)
+                         for (slot, _), new in zip(old, slot_ids))
+        
+        for index in indexes:
+            self._unplace(index)
+        
+        placed = []
+        for index, slot_id in zip(indexes, slot_ids):
+            room_id = self._free_room(index, slot_id)
+            if room_id is None:
+                break
+            self.slot[index], self.room[index] = slot_id, room_id
+            self._place(index)
+            placed.append(index)
+        
+        if len(placed) == len(indexes):
+            delta = (self._group_cost(division_keys, faculty_keys) - before +
+                     self.weights.late_weight * late_delta)
+            if delta <= 0 or self.rng.random() < math.exp(-delta / temperature):
+                self.cost += delta
+                return True
+        
+        # Infeasible or rejected: restore the previous assignment
+        for index in placed:
+            self._unplace(index)
+        for index, (slot_id, room_id) in zip(indexes, old):
+            self.slot[index], self.room[index] = slot_id, room_id
+            self._place(index)
+        return False
+    
+    def run(self, time_budget, max_iterations=None, start_temperature=2.0, end_temperature=0.01):
+        """
+        Anneal until the time budget or iteration limit is reached.
+        
+        With max_iterations set and a generous time budget the run is fully
+        reproducible for a given seed.
+        
+        Returns:
+            tuple: (best cost, {course_id: (time_slot_id, room_id)} for the best state)
+        """
+        best_cost = self.cost
+        best = (list(self.slot), list(self.room))
+        if not self.course_ids or not self.slot_ids:
+            return best_cost, {}
+        
+        start = time.monotonic()
+        iteration = 0
+        temperature = start_temperature
+        while max_iterations is None or iteration < max_iterations:
+            if iteration % 256 == 0:
+                elapsed = time.monotonic() - start
+                if elapsed >= time_budget:
+                    break
+                progress = elapsed / time_budget
+                if max_iterations:
+                    progress = max(progress, iteration / max_iterations)
+                temperature = start_temperature * (end_temperature / start_temperature) ** progress
+            iteration += 1
+            
+            index = self.rng.randrange(len(self.course_ids))
+            peers = self.by_division[self.division[index]]
+            if len(peers) > 1 and self.rng.random() < 0.3:
+                # Swap slots with another course of the same division
+                other = self.rng.choice(peers)
+                if other == index or self.slot[other] == self.slot[index]:
+                    continue
+                self._try_assign([index, other], [self.slot[other], self.slot[index]], temperature)
+            else:
+                slot_id = self.rng.choice(self.slot_ids)
+                if slot_id == self.slot[index]:
+                    continue
+                self._try_assign([index], [slot_id], temperature)
+            
+            if self.cost < best_cost - 1e-9:
+                best_cost = self.cost
+                best = (list(self.slot), list(self.room))
+        
+        assignments = {
+            course_id: (slot_id, room_id)
+            for course_id, slot_id, room_id in zip(self.course_ids, best[0], best[1])
+        }
+        return best_cost, assignments
+
+def _run_restart(args):
+    """Process-pool entry point: run one independent restart."""
+    problem, weights, seed, time_budget, max_iterations = args
+    search = LocalSearch(problem, weights, seed)
+    cost, assignments = search.run(time_budget, max_iterations)
+    return cost, assignments, seed
+
+class TimetableOptimizer:
+    """Improves the saved timetable against soft constraints."""
+    
+    def __init__(self, weights=None):
+        self.weights = weights or SoftConstraints()
+    
+    def load_problem(self):
+        """Load courses, slots and rooms as plain tuples with column-only queries."""
+        late_after = tuple(int(part) for part in self.weights.late_after.split(':'))
+        slots = []
+        positions = defaultdict(int)
+        for slot_id, day, start_time in db.session.query(
+            TimeSlot.id, TimeSlot.day, TimeSlot.start_time
+        ).order_by(TimeSlot.day, TimeSlot.start_time, TimeSlot.id):
+            slots.append((slot_id, day, positions[day],
+                          (start_time.hour, start_time.minute) >= late_after))
+            positions[day] += 1
+        
+        return {
+            'courses': db.session.query(
+                Course.id, Course.faculty_id, Course.division_id, Course.room_id, Course.time_slot_id
+            ).order_by(Course.id).all(),
+            'slots': slots,
+            'rooms': db.session.query(Room.id, Room.capacity, Room.is_lab).all()
+        }
+    
+    def optimize(self, time_budget=10.0, restarts=4, workers=None, seed=0, max_iterations=None):
+        """
+        Run independent restarts, in parallel when workers > 1, and keep the best.
+        
+        Args:
+            time_budget: Seconds each restart may run
+            restarts: Number of independent restarts
+            workers: Size of the process pool; None or 1 runs in-process
+            seed: Base seed; restart i uses seed + i
+            max_iterations: Optional iteration cap per restart
+        
+        Returns:
+            OptimizationResult: Only the courses whose assignment changed
+        
+        Raises:
+            ValueError: If restarts is below 1 or time_budget is not positive
+        """
+        if restarts < 1:
+            raise ValueError(f'restarts must be at least 1, not {restarts}')
+        if time_budget <= 0:
+            raise ValueError(f'time_budget must be positive, not {time_budget}')
+        problem = self.load_problem()
+        initial = {c[0]: (c[4], c[3]) for c in problem['courses']}
+        initial_cost = LocalSearch(problem, self.weights, seed).cost
+        jobs = [(problem, self.weights, seed + i, time_budget, max_iterations) for i in range(restarts)]
+        
+        if workers and workers > 1:
+            with ProcessPoolExecutor(max_workers=workers) as pool:
+                outcomes = list(pool.map(_run_restart, jobs))
+        else:
+            outcomes = [_run_restart(job) for job in jobs]
+        
+        # Lowest cost wins; ties go to the lowest seed for reproducibility
+        cost, assignments, best_seed = min(outcomes, key=lambda outcome: (outcome[0], outcome[2]))
+        changed = {
+            course_id: placement for course_id, placement in assignments.items()
+            if placement != initial[course_id]
+        }
+        return OptimizationResult(initial_cost, cost, changed, best_seed)
+    
+    @staticmethod
+    def commit(result):
+        """
+        Save the changed assignments in a single transaction.
+        
+        Returns:
+            int: Number of courses updated
+        """
+        if not result.assignments:
+            return 0
+        
+        try:
+            # Unique indexes are checked row by row, so swapped courses would
+            # clash halfway through an in-place update. Delete the moved rows
+            # and insert them again at their targets, keeping their IDs and
+            # every other column, so no row ever points at a missing slot.
+            columns = Course.__table__.columns
+            course_ids = list(result.assignments)
+            rows = []
+            for start in range(0, len(course_ids), 500):
+                batch = course_ids[start:start + 500]
+                for values in db.session.query(*columns).filter(Course.id.in_(batch)):
+                    row = dict(zip(columns.keys(), values))
+                    row['time_slot_id'], row['room_id'] = result.assignments[row['id']]
+                    rows.append(row)
+                Course.query.filter(Course.id.in_(batch)).delete(synchronize_session=False)
+            db.session.bulk_insert_mappings(Course, rows)
+            TimetableScheduler.record_changes(result.assignments)
+            db.session.commit()
+        except Exception:
+            db.session.rollback()
+            raise
+        
+        TimetableScheduler.resync()
+        return len(result.assignments)
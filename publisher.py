@@ -0,0 +1,249 @@
+# publisher.py
+"""
+Static snapshots of the student timetables.
+
+Student pages are read far more often than bookings change, so each
+division's page can be pre-rendered and served as a plain file by the web
+server in front of the application. The layout of the output directory is:
+    
+    division-<id>.html    the rendered student_dashboard.html page
+    division-<id>.json    the same timetable as /api/timetable/division/<id>
+    manifest.json         version of every published division
+    .publish.lock         held while a process publishes
+
+Every file is written to a temporary file in the same directory and renamed
+into place, so readers see either the old page or the new one, never a
+partial write. A division's version is its timetable ETag plus a digest of
+the division list shown in the page's selector, so unchanged pages are
+never rewritten. Publishing runs on a background thread rather than in the
+request, and one publisher at a time holds the directory's lock file, so
+workers and the publish-timetables command never interleave their manifest
+updates.
+"""
+from contextlib import contextmanager
+import hashlib
+import json
+import os
+import tempfile
+import threading
+from types import SimpleNamespace
+
+try:
+    import fcntl
+except ImportError:  # Not on Windows; threads are still serialized
+    fcntl = None
+
+from flask import current_app, render_template
+
+from exporter import timetable_document
+from models import db, Division
+from utils import TimetableScheduler
+
+class TimetablePublisher:
+    """
+    Writes pre-rendered student timetables to a static directory.
+    
+    Register mark_changed() with TimetableScheduler.add_change_listener() and
+    call wake() after each request to keep the directory current from a
+    background thread, or call publish() directly from a command.
+    """
+    
+    MANIFEST = 'manifest.json'
+    LOCK = '.publish.lock'
+    
+    def __init__(self, directory=None):
+        """
+        Args:
+            directory: Output directory, or None to use
+                app.config['STATIC_PUBLISH_DIR'] at publish time
+        """
+        self.directory = directory
+        self._lock = threading.Lock()
+        # Division IDs to check, or None to check every division. The first
+        # pass checks everything so changes made while stopped are picked up.
+        self._pending = None
+        self._dirty = True
+        self._publish_lock = threading.Lock()
+        self._worker = None
+        self._worker_pid = None
+        self._wakeup = None
+    
+    def get_directory(self):
+        return self.directory or current_app.config.get('STATIC_PUBLISH_DIR')
+    
+    def mark_changed(self, keys):
+        """Change listener: remember which divisions need republishing."""
+        if keys is not None:
+            division_ids = {int(key.split('_', 1)[1]) for key in keys if key.startswith('division_')}
+            if not division_ids:
+                return
+        with self._lock:
+            if keys is None:
+                self._pending = None
+            elif self._pending is not None:
+                self._pending.update(division_ids)
+            self._dirty = True
+    
+    def wake(self, app):
+        """
+        Have the background thread publish pending divisions, if any.
+        
+        The thread is started on first use, and again after a fork, since
+        threads do not survive into the child process.
+        
+        Args:
+            app: The Flask application to publish from
+        """
+        if not self._dirty or not (self.directory or app.config.get('STATIC_PUBLISH_DIR')):
+            return
+        with self._lock:
+            if self._worker is None or not self._worker.is_alive() or self._worker_pid != os.getpid():
+                self._wakeup = threading.Event()
+                self._worker = threading.Thread(target=self._run, args=(app, self._wakeup),
+                                                name='timetable-publisher', daemon=True)
+                self._worker_pid = os.getpid()
+                self._worker.start()
+            self._wakeup.set()
+    
+    def _run(self, app, wakeup):
+        while True:
+            wakeup.wait()
+            wakeup.clear()
+            with app.app_context():
+                try:
+                    self.publish_pending()
+                finally:
+                    db.session.remove()
+    
+    def publish_pending(self):
+        """
+        Republish the divisions changed since the last call.
+        
+        Does nothing when no directory is configured. If writing fails the
+        divisions stay pending and are retried on the next call.
+        
+        Returns:
+            list: IDs of the divisions written
+        """
+        if not self._dirty or not self.get_directory():
+            return []
+        with self._lock:
+            division_ids, self._pending, self._dirty = self._pending, set(), False
+        
+        try:
+            return self.publish(division_ids)
+        except Exception:
+            current_app.logger.exception('Publishing student timetables failed')
+            self.mark_changed(None if division_ids is None else
+                              [f'division_{division_id}' for division_id in division_ids])
+            return []
+    
+    def publish(self, division_ids=None, force=False):
+        """
+        Write the pages of divisions whose timetable changed.
+        
+        Args:
+            division_ids: IDs to check, or None for every division. A full
+                pass also removes the files of deleted divisions.
+            force: Rewrite pages even if their version is unchanged
+        
+        Returns:
+            list: IDs of the divisions written
+        """
+        directory = self.get_directory()
+        os.makedirs(directory, exist_ok=True)
+        with self._publish_lock, self._lock_directory(directory):
+            return self._publish(directory, division_ids, force)
+    
+    def _publish(self, directory, division_ids, force):
+        manifest = self._read_manifest(directory)
+        
+        divisions = [SimpleNamespace(id=division_id, name=name) for division_id, name in
+                     db.session.query(Division.id, Division.name).order_by(Division.id)]
+        # Every page lists all divisions, so a new or renamed one changes them all
+        layout = hashlib.blake2b(
+            repr([(division.id, division.name) for division in divisions]).encode(), digest_size=6
+        ).hexdigest()
+        if division_ids is not None and \
+                any(not version.startswith(f'{layout}-') for version in manifest.values()):
+            division_ids = None
+        
+        written = []
+        # url_for() needs a request; a fresh one also keeps the page anonymous
+        with current_app.test_request_context('/'):
+            for division in divisions:
+                if division_ids is not None and division.id not in division_ids:
+                    continue
+                
+                version = f"{layout}-{TimetableScheduler.get_timetable_etag('division', division.id)}"
+                path = os.path.join(directory, f'division-{division.id}')
+                if not force and manifest.get(str(division.id)) == version and \
+                        os.path.exists(path + '.html') and os.path.exists(path + '.json'):
+                    continue
+                
+                timetable = TimetableScheduler.get_timetable_for_division(division.id)
+                # Static pages may be served without the application, so
+                # they leave out the live event stream
+                html = render_template('student_dashboard.html', timetable=timetable,
+                                       division=division, divisions=divisions, static_page=True)
+                document = timetable_document('division', division.id, division.name, timetable)
+                self._write_atomic(path + '.html', html)
+                self._write_atomic(path + '.json', json.dumps(document))
+                manifest[str(division.id)] = version
+                written.append(division.id)
+        
+        removed = []
+        if division_ids is None:
+            current = {str(division.id) for division in divisions}
+            removed = [key for key in manifest if key not in current]
+            for key in removed:
+                for suffix in ('.html', '.json'):
+                    try:
+                        os.remove(os.path.join(directory, f'division-{key}{suffix}'))
+                    except FileNotFoundError:
+                        pass
+                del manifest[key]
+        
+        # The manifest goes last, so a crash midway only causes extra rewrites
+        if written or removed:
+            self._write_atomic(os.path.join(directory, self.MANIFEST),
+                               json.dumps(manifest, sort_keys=True, indent=2))
+        return written
+    
+    @contextmanager
+    def _lock_directory(self, directory):
+        """Hold an exclusive lock on the directory's lock file, where supported."""
+        if fcntl is None:
+            yield
+            return
+        with open(os.path.join(directory, self.LOCK), 'a') as handle:
+            fcntl.flock(handle, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(handle, fcntl.LOCK_UN)
+    
+    def _read_manifest(self, directory):
+        try:
+            with open(os.path.join(directory, self.MANIFEST), encoding='utf-8') as handle:
+                return json.load(handle)
+        except (FileNotFoundError, ValueError):
+            return {}
+    
+    @staticmethod
+    def _write_atomic(path, text):
+        """Write text to path through a temporary file and a rename."""
+        handle, temp_path = tempfile.mkstemp(dir=os.path.dirname(path) or '.',
+                                             prefix='.', suffix='.tmp')
+        try:
+            with os.fdopen(handle, 'w', encoding='utf-8') as temp:
+                temp.write(text)
+            # mkstemp creates the file private to this user; the web server must read it
+            os.chmod(temp_path, 0o644)
+            os.replace(temp_path, path)
+        except BaseException:
+            try:
+                os.remove(temp_path)
+            except FileNotFoundError:
+                pass
+            raise
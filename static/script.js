@@ -37,6 +37,81 @@ function initTimeSlotHighlight() {
     });
 }
 
+// Fill one timetable cell from a change event
+function renderCourseSlot(table, cell, course) {
+    const editUrl = table.dataset.editUrl;
+    cell.replaceChildren();
+    if (!course) {
+        cell.className = 'course-slot empty';
+        return;
+    }
+    cell.className = 'course-slot occupied' + (editUrl ? '' : ' student-view');
+    
+    const details = document.createElement('div');
+    details.className = 'course-details';
+    const name = document.createElement('strong');
+    name.textContent = course.name;
+    details.appendChild(name);
+    table.dataset.fields.split(',').forEach(field => {
+        const line = document.createElement('div');
+        line.textContent = `${field.charAt(0).toUpperCase() + field.slice(1)}: ${course[field]}`;
+        details.appendChild(line);
+    });
+    
+    if (editUrl) {
+        const actions = document.createElement('div');
+        actions.className = 'course-actions';
+        const edit = document.createElement('a');
+        edit.href = editUrl.replace(/0$/, course.id);
+        edit.className = 'action-btn edit';
+        edit.textContent = 'Edit';
+        const remove = document.createElement('a');
+        remove.href = table.dataset.deleteUrl.replace(/0$/, course.id);
+        remove.className = 'action-btn delete';
+        remove.textContent = 'Delete';
+        remove.onclick = () => confirm('Are you sure you want to delete this course?');
+        actions.append(edit, remove);
+        details.appendChild(actions);
+    }
+    cell.appendChild(details);
+}
+
+// Keep a timetable current by patching its cells from the server's event stream
+function initLiveTimetable() {
+    const table = document.querySelector('table.timetable[data-events]');
+    if (!table || !window.EventSource) {
+        return;
+    }
+    
+    const applyChanges = changes => {
+        for (const change of changes) {
+            const cell = table.querySelector(
+                `td[data-day="${change.day}"][data-time="${change.time}"]`
+            );
+            if (!cell) {
+                // The time slots changed; only a reload can redraw the grid
+                window.location.reload();
+                return;
+            }
+            renderCourseSlot(table, cell, change.course);
+        }
+    };
+    
+    const source = new EventSource(table.dataset.events);
+    source.addEventListener('patch', event => {
+        applyChanges(JSON.parse(event.data).changes);
+    });
+    source.addEventListener('reset', event => {
+        const changes = [];
+        for (const day of JSON.parse(event.data).days) {
+            for (const slot of day.slots) {
+                changes.push({ day: day.day, time: slot.time, course: slot.course });
+            }
+        }
+        applyChanges(changes);
+    });
+}
+
 // Initialize when page loads
 document.addEventListener('DOMContentLoaded', function() {
     // Initialize tab functionality if we're on the index page
@@ -51,4 +126,7 @@ document.addEventListener('DOMContentLoaded', function() {
     
     // Initialize time slot highlighting
     initTimeSlotHighlight();
+    
+    // Receive live timetable changes
+    initLiveTimetable();
 });
\ No newline at end of file
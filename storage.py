@@ -0,0 +1,43 @@
+# storage.py
+"""
+SQLite storage profile.
+
+The pragmas in Config.SQLITE_PRAGMAS are per connection (apart from
+journal_mode, which is stored in the database file), so they are applied by
+a connect listener to every connection SQLAlchemy opens.
+"""
+import sqlite3
+
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+def apply_pragmas(dbapi_connection, pragmas):
+    """Run PRAGMA statements on a raw sqlite3 connection."""
+    cursor = dbapi_connection.cursor()
+    try:
+        for name, value in pragmas.items():
+            cursor.execute(f'PRAGMA {name} = {value}')
+    finally:
+        cursor.close()
+
+# Pragmas applied by _set_sqlite_pragmas, as last set by configure_sqlite()
+_pragmas = {}
+
+def _set_sqlite_pragmas(dbapi_connection, connection_record):
+    if _pragmas and isinstance(dbapi_connection, sqlite3.Connection):
+        apply_pragmas(dbapi_connection, _pragmas)
+
+def configure_sqlite(app):
+    """
+    Apply app.config['SQLITE_PRAGMAS'] to every new SQLite connection.
+    
+    The listener is registered on the Engine class, so it also covers
+    engines Flask-SQLAlchemy recreates when the database URI changes.
+    It is registered once per process; calling this again replaces the
+    pragmas rather than adding a second listener. Connections to other
+    databases are left alone.
+    """
+    _pragmas.clear()
+    _pragmas.update(app.config.get('SQLITE_PRAGMAS') or {})
+    if _pragmas and not event.contains(Engine, 'connect', _set_sqlite_pragmas):
+        event.listen(Engine, 'connect', _set_sqlite_pragmas)